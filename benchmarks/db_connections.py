@@ -0,0 +1,95 @@
+"""
+Compare per-request connection cost with and without the connection pool.
+
+Each simulated request opens a connection, runs a few small queries and closes
+it, the way Django does with CONN_MAX_AGE = 0. Point it at a local Postgres:
+
+    DJANGO_SETTINGS_MODULE=grocery_list.settings python benchmarks/db_connections.py --requests 500
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_list.settings')
+
+import django
+
+django.setup()
+
+from django.db import connections
+from django.db.utils import load_backend
+
+
+def make_wrapper (alias, pooled) :
+    settings_dict = copy.deepcopy(connections['default'].settings_dict)
+    options = settings_dict['OPTIONS']
+
+    if pooled :
+        settings_dict['ENGINE'] = 'grocery_list.db.postgresql'
+        options.setdefault('pool', { 'min_size': 2, 'max_size': 10 })
+    else :
+        settings_dict['ENGINE'] = 'django.db.backends.postgresql'
+        options.pop('pool', None)
+
+    return load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+
+
+def simulated_request (alias, pooled, queries) :
+    # a fresh wrapper per request, like a new request thread
+    wrapper = make_wrapper(alias, pooled)
+    started = time.perf_counter()
+
+    with wrapper.cursor() as cursor :
+        for _ in range(queries) :
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+    wrapper.close()
+    return time.perf_counter() - started
+
+
+def run (pooled, requests, concurrency, queries) :
+    alias = 'pooled' if pooled else 'unpooled'
+    simulated_request(alias, pooled, queries)
+
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers = concurrency) as executor :
+        latencies = sorted(executor.map(lambda _ : simulated_request(alias, pooled, queries), range(requests)))
+
+    elapsed = time.perf_counter() - started
+    result = {
+        'mode': alias,
+        'requests': requests,
+        'concurrency': concurrency,
+        'throughput': round(requests / elapsed, 2),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+    }
+
+    if pooled :
+        result['pool'] = make_wrapper(alias, pooled).pool_stats()
+
+    return result
+
+
+def main () :
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type = int, default = 500)
+    parser.add_argument('--concurrency', type = int, default = 4)
+    parser.add_argument('--queries', type = int, default = 3, help = 'queries per simulated request')
+    args = parser.parse_args()
+
+    results = [run(pooled, args.requests, args.concurrency, args.queries) for pooled in (False, True)]
+    print(json.dumps(results, indent = 2))
+
+
+if __name__ == '__main__' :
+    main()
@@ -0,0 +1,446 @@
+"""
+Seed a synthetic dataset and load test every route in main_app/urls.py.
+
+Households, members, stores and items are created through the real models.
+Each virtual user then signs in the way a person does:
+
+    household_select -> member_select -> store_list -> item_list -> item_create
+
+After signing in, each user requests every named route --iterations times.
+Latency percentiles, throughput and queries per request are reported per
+route. In process the queries are counted on every database connection until
+the body has been read, streamed bodies included. Over http they come from
+the Server-Timing header that main_app.instrumentation adds, which is set
+before a streamed body runs its queries, so streamed routes are not measured.
+
+Any response outside 2xx and 3xx fails the run and no baseline is written.
+
+By default requests go through the Django test client in this process. Pass
+--base-url to load a running server instead; it must use the same database:
+
+    python benchmarks/load_test.py --households 10 --members 2 --stores 3 --items 500 --output before.json
+    python benchmarks/load_test.py --no-seed --compare before.json --output after.json
+    python benchmarks/load_test.py --no-seed --base-url http://localhost:8000 --users 16
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib import request as urllib_request
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_list.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main_app.models import Household, Member, Store, Item
+from main_app.routers import database_route, shards, shard_for
+from main_app.urls import urlpatterns
+
+# seeded households all live in this city, so reseeding only touches them
+SEED_CITY = 'loadtest'
+SEED_STATE = 'lt'
+SEED_ZIP = '00000'
+PASSCODE = 'load-test-passcode'
+PASSWORD = 'load-test-password'
+
+QUERIES_PATTERN = re.compile(r'(\d+) queries')
+
+
+def seed (households, members, stores, items, batch_size = 1000) :
+    for alias in shards() :
+        Household.objects.using(alias).filter(city = SEED_CITY).delete()
+
+    for household_number in range(households) :
+        # the id picks the shard, everything else in the household is written there with it
+        household = Household.objects.create(
+            street_address = f'{household_number} load test way',
+            city = SEED_CITY,
+            state = SEED_STATE,
+            zip_code = SEED_ZIP,
+            passcode = PASSCODE,
+        )
+
+        with database_route(household_id = household.id), transaction.atomic(using = shard_for(household.id)) :
+            for member_number in range(members) :
+                Member.objects.create(name = f'member {member_number}', password = PASSWORD, household = household)
+
+            for store_number in range(stores) :
+                store = Store.objects.create(
+                    name = f'store {store_number}',
+                    street_address = f'{store_number} market st',
+                    city = SEED_CITY,
+                    state = SEED_STATE,
+                    zip_code = SEED_ZIP,
+                    household = household,
+                )
+
+                Item.objects.bulk_create([
+                    Item(
+                        name = f'item {item_number}',
+                        description = f'synthetic item {item_number} for {store.name}',
+                        price = item_number % 20 + 0.99,
+                        current_stock = item_number % 7,
+                        minimum_stock = 2,
+                        ideal_stock = 8,
+                        store = store,
+                    )
+                    for item_number in range(items)
+                ], batch_size = batch_size)
+
+def seeded_accounts () :
+    # one account per member, with a store and an item to aim the per-store routes at
+    accounts = []
+
+    for alias in shards() :
+        with database_route(alias = alias) :
+            stores = Store.objects.filter(household__city = SEED_CITY).order_by('household', 'id')
+            first_store = {}
+
+            for store in stores :
+                first_store.setdefault(store.household_id, store)
+
+            for member in Member.objects.filter(household__city = SEED_CITY).select_related('household').order_by('household', 'id') :
+                store = first_store.get(member.household_id)
+                item = Item.objects.filter(store = store).order_by('id').first() if store else None
+
+                if store is None or item is None :
+                    continue
+
+                accounts.append({
+                    'household': member.household,
+                    'member_id': member.id,
+                    'store_id': store.id,
+                    'item_id': item.id,
+                })
+
+    return accounts
+
+def client_host () :
+    # the test client's own host, testserver, is not in ALLOWED_HOSTS and would get a 400
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    return host.lstrip('.')
+
+def server_timing_queries (server_timing) :
+    match = QUERIES_PATTERN.search(server_timing)
+    return int(match.group(1)) if match else None
+
+
+class InProcessTransport :
+    # the full middleware stack without a socket, csrf checks are off in the test client.
+    # server errors are counted as 500s rather than raised, like they would be over http
+
+    def __init__ (self) :
+        self.client = Client(HTTP_HOST = client_host(), raise_request_exception = False)
+
+    def request (self, method, path, data = None, content_type = None) :
+        # counted on this thread's connections until the body is read, Server-Timing is set before
+        # a streamed body runs its queries
+        with ExitStack() as stack :
+            captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+
+            if method == 'GET' :
+                response = self.client.get(path)
+            elif content_type :
+                response = self.client.post(path, data, content_type = content_type)
+            else :
+                response = self.client.post(path, data)
+
+            if response.streaming :
+                b''.join(response.streaming_content)
+
+        return response.status_code, sum(len(capture) for capture in captures)
+
+    def close (self) :
+        connections.close_all()
+
+
+class NoRedirect (urllib_request.HTTPRedirectHandler) :
+    # every hop of the login flow is timed on its own
+    def redirect_request (self, *args, **kwargs) :
+        return None
+
+
+class HttpTransport :
+    def __init__ (self, base_url) :
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = urllib_request.build_opener(urllib_request.HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def csrf_token (self) :
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request (self, method, path, data = None, content_type = None) :
+        headers = { 'X-CSRFToken': self.csrf_token() }
+        body = None
+
+        if method == 'POST' :
+            if content_type :
+                body = data.encode()
+                headers['Content-Type'] = content_type
+            else :
+                body = urlencode({ **data, 'csrfmiddlewaretoken': self.csrf_token() }).encode()
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        try :
+            with self.opener.open(urllib_request.Request(self.base_url + path, body, headers, method = method)) as response :
+                response.read()
+                return response.status, self.queries(response.headers)
+
+        except HTTPError as error :
+            error.read()
+            return error.code, self.queries(error.headers)
+
+    def queries (self, headers) :
+        # CommonMiddleware sets Content-Length on every response that is not streamed. a streamed
+        # body runs its queries after Server-Timing was set, so those routes are not measured
+        if headers.get('Content-Length') is None :
+            return None
+
+        return server_timing_queries(headers.get('Server-Timing', ''))
+
+    def close (self) :
+        pass
+
+
+def login_requests (account) :
+    household = account['household']
+    store_id = account['store_id']
+
+    return [
+        ('household_select', 'GET', reverse('household_select'), None, None),
+        ('household_select', 'POST', reverse('household_select'), {
+            'street_address': household.street_address,
+            'city': household.city,
+            'state': household.state,
+            'zip_code': household.zip_code,
+            'passcode': PASSCODE,
+        }, None),
+        ('member_select', 'GET', reverse('member_select'), None, None),
+        ('member_select', 'POST', reverse('member_select'), { 'member_id': account['member_id'], 'password': PASSWORD }, None),
+        ('store_list', 'GET', reverse('store_list'), None, None),
+        ('item_list', 'GET', reverse('item_list', kwargs = { 'store_id': store_id }), None, None),
+        ('item_create', 'GET', reverse('item_create', kwargs = { 'store_id': store_id }), None, None),
+    ]
+
+def item_create_request (account, number) :
+    return ('item_create', 'POST', reverse('item_create', kwargs = { 'store_id': account['store_id'] }), {
+        'name': f'load {threading.get_ident() % 10000} {number}',
+        'current_stock': 1,
+        'minimum_stock': 1,
+        'ideal_stock': 4,
+    }, None)
+
+def write_request (name, account) :
+    # json endpoints that only accept POST get a small realistic payload
+    item_id = account['item_id']
+
+    if name in ('stock_update', 'store_stock_update') :
+        return json.dumps({ str(item_id): 1 }), 'application/json'
+
+    if name == 'stock_event_create' :
+        return json.dumps({ 'kind': 'consume', 'quantity': 1 }), 'application/json'
+
+    return None
+
+def route_requests (account) :
+    values = { 'store_id': account['store_id'], 'item_id': account['item_id'] }
+    requests = []
+
+    for pattern in urlpatterns :
+        kwargs = { name: value for name, value in values.items() if f'<int:{name}>' in str(pattern.pattern) }
+        path = reverse(pattern.name, kwargs = kwargs)
+        payload = write_request(pattern.name, account)
+
+        if payload :
+            requests.append((pattern.name, 'POST', path, payload[0], payload[1]))
+        else :
+            requests.append((pattern.name, 'GET', path, None, None))
+
+    return requests
+
+
+def virtual_user (transport, account, iterations) :
+    samples = []
+
+    def send (name, method, path, data, content_type) :
+        started = time.perf_counter()
+        status, queries = transport.request(method, path, data, content_type)
+        latency = time.perf_counter() - started
+        samples.append({
+            'route': name,
+            'method': method,
+            'status': status,
+            'latency': latency,
+            'queries': queries,
+        })
+
+    try :
+        for request in login_requests(account) :
+            send(*request)
+
+        send(*item_create_request(account, 0))
+
+        for iteration in range(iterations) :
+            for request in route_requests(account) :
+                send(*request)
+
+    finally :
+        transport.close()
+
+    return samples
+
+
+def percentile (sorted_values, fraction) :
+    # nearest rank
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def summarize (samples, elapsed) :
+    latencies = sorted(sample['latency'] for sample in samples)
+    queries = [sample['queries'] for sample in samples if sample['queries'] is not None]
+    statuses = {}
+
+    for sample in samples :
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+
+    summary = {
+        'requests': len(samples),
+        'statuses': statuses,
+        # timings of error responses say nothing about the routes
+        'errors': sum(1 for sample in samples if not 200 <= sample['status'] < 400),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+    }
+
+    if elapsed is not None :
+        summary['throughput'] = round(len(samples) / elapsed, 2)
+
+    return summary
+
+def git_commit () :
+    try :
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) :
+        return None
+
+def run (args) :
+    if not args.no_seed :
+        seed(args.households, args.members, args.stores, args.items)
+
+    accounts = seeded_accounts()
+
+    if not accounts :
+        raise SystemExit('No seeded households found, run without --no-seed first')
+
+    def make_transport () :
+        return HttpTransport(args.base_url) if args.base_url else InProcessTransport()
+
+    # one pass to warm templates, caches and connections
+    virtual_user(make_transport(), accounts[0], 1)
+
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers = args.users) as executor :
+        futures = [
+            executor.submit(virtual_user, make_transport(), accounts[number % len(accounts)], args.iterations)
+            for number in range(args.users)
+        ]
+        samples = [sample for future in futures for sample in future.result()]
+
+    elapsed = time.perf_counter() - started
+    routes = {}
+
+    for sample in samples :
+        routes.setdefault(f'{sample["method"]} {sample["route"]}', []).append(sample)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'transport': args.base_url or 'in-process',
+            'database': connections['default'].vendor,
+            'dataset': { 'households': args.households, 'members': args.members, 'stores': args.stores, 'items': args.items },
+            'users': args.users,
+            'iterations': args.iterations,
+        },
+        'total': summarize(samples, elapsed),
+        'routes': { route: summarize(route_samples, None) for route, route_samples in sorted(routes.items()) },
+    }
+
+def compare (baseline, result) :
+    # relative change per route, positive is slower or chattier than the baseline
+    lines = [f'compared with {baseline["meta"].get("commit")} ({baseline["meta"].get("created_at")})']
+
+    for route, current in [('total', result['total'])] + list(result['routes'].items()) :
+        previous = baseline['total'] if route == 'total' else baseline['routes'].get(route)
+
+        if not previous :
+            lines.append(f'{route:40} new')
+            continue
+
+        changes = []
+
+        for key in ['p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'throughput'] :
+            if previous.get(key) and current.get(key) is not None :
+                changes.append(f'{key} {(current[key] - previous[key]) / previous[key] * 100:+.1f}%')
+
+        lines.append(f'{route:40} ' + ', '.join(changes))
+
+    return '\n'.join(lines)
+
+
+def main () :
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--households', type = int, default = 5)
+    parser.add_argument('--members', type = int, default = 2, help = 'members per household')
+    parser.add_argument('--stores', type = int, default = 3, help = 'stores per household')
+    parser.add_argument('--items', type = int, default = 200, help = 'items per store')
+    parser.add_argument('--no-seed', action = 'store_true', help = 'reuse the households seeded by an earlier run')
+    parser.add_argument('--users', type = int, default = 8, help = 'concurrent virtual users')
+    parser.add_argument('--iterations', type = int, default = 5, help = 'passes over every route per user')
+    parser.add_argument('--base-url', help = 'load a running server instead of the in-process test client')
+    parser.add_argument('--output', help = 'write the results as a json baseline')
+    parser.add_argument('--compare', help = 'json baseline from an earlier run')
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps(result, indent = 2))
+
+    if args.compare :
+        print(compare(json.loads(Path(args.compare).read_text()), result))
+
+    errors = { route: summary['statuses'] for route, summary in result['routes'].items() if summary['errors'] }
+
+    if errors :
+        raise SystemExit(f'{result["total"]["errors"]} responses outside 2xx and 3xx, no baseline written: {json.dumps(errors)}')
+
+    if args.output :
+        Path(args.output).write_text(json.dumps(result, indent = 2))
+
+
+if __name__ == '__main__' :
+    main()
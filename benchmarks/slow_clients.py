@@ -0,0 +1,91 @@
+"""
+Drive one URL with many concurrent slow clients and report latency and throughput.
+
+Compare the sync and async read views under uvicorn:
+
+    ASYNC_ROOT_URLCONF= uvicorn grocery_list.asgi:application --port 8001
+    uvicorn grocery_list.asgi:application --port 8002
+
+    python benchmarks/slow_clients.py http://localhost:8001/stores --session <sessionid>
+    python benchmarks/slow_clients.py http://localhost:8002/stores --session <sessionid>
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def slow_request (url, session, send_delay) :
+    # headers trickle in line by line, like a client on a poor mobile connection
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    lines = [
+        f'GET {parts.path or "/"}{"?" + parts.query if parts.query else ""} HTTP/1.1',
+        f'Host: {parts.hostname}',
+        'Connection: close',
+    ]
+
+    if session :
+        lines.append(f'Cookie: sessionid={session}')
+
+    started = time.perf_counter()
+
+    for line in lines :
+        writer.write(f'{line}\r\n'.encode())
+        await writer.drain()
+        await asyncio.sleep(send_delay)
+
+    writer.write(b'\r\n')
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    await reader.read()
+    writer.close()
+    return status, time.perf_counter() - started
+
+
+async def run (url, session, concurrency, requests, send_delay) :
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def client () :
+        async with semaphore :
+            status, latency = await slow_request(url, session, send_delay)
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(requests)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'requests': requests,
+        'statuses': statuses,
+        'throughput': round(requests / elapsed, 2),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def main () :
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url')
+    parser.add_argument('--session', help = 'sessionid cookie of a logged in household')
+    parser.add_argument('--concurrency', type = int, default = 200)
+    parser.add_argument('--requests', type = int, default = 2000)
+    parser.add_argument('--send-delay', type = float, default = 0.05, help = 'seconds between request lines')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.session, args.concurrency, args.requests, args.send_delay))
+    print(json.dumps(result, indent = 2))
+
+
+if __name__ == '__main__' :
+    main()
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "grocery_list.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once django is set up, it reads settings and loads the session engine
+from main_app.live import LiveUpdates  # noqa: E402
+
+# /live streams item changes to open list pages, over SSE or a websocket, everything else is django
+application = LiveUpdates(django_application)
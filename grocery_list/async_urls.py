@@ -0,0 +1,12 @@
+"""
+URL configuration used for requests arriving through asgi.py.
+
+Mirrors grocery_list.urls but serves main_app's read paths with async views.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    path('', include ('main_app.async_urls')),
+]
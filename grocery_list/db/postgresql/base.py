@@ -0,0 +1,98 @@
+"""
+PostgreSQL backend that checks connections out of a psycopg_pool pool.
+
+Configured through DATABASES[alias]['OPTIONS']['pool'], using the same option
+names as psycopg_pool.ConnectionPool (min_size, max_size, max_lifetime,
+max_idle, timeout). Without a 'pool' option it behaves like the stock backend.
+"""
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+
+
+class DatabaseWrapper (base.DatabaseWrapper) :
+    # one pool per alias per process, shared by every thread's wrapper
+    _connection_pools = {}
+    _pools_lock = threading.Lock()
+
+    # connect() counters, kept for pooled and unpooled aliases so the two can be compared
+    connect_stats = {}
+
+    def get_connection_params (self) :
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @property
+    def pool (self) :
+        pool_options = self.settings_dict['OPTIONS'].get('pool')
+
+        if not pool_options :
+            return None
+
+        if self.alias not in self._connection_pools :
+            if not is_psycopg3 :
+                raise ImproperlyConfigured('Connection pooling requires psycopg 3.')
+
+            if self.settings_dict['CONN_MAX_AGE'] != 0 :
+                raise ImproperlyConfigured('Pooled connections are returned after each request, set CONN_MAX_AGE to 0.')
+
+            from psycopg_pool import ConnectionPool
+
+            pool_options = {} if pool_options is True else dict(pool_options)
+            connect_kwargs = self.get_connection_params()
+            connect_kwargs['autocommit'] = True
+
+            with self._pools_lock :
+                if self.alias not in self._connection_pools :
+                    self._connection_pools[self.alias] = ConnectionPool(
+                        kwargs = connect_kwargs,
+                        open = True,
+                        name = self.alias,
+                        check = ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                        **pool_options
+                    )
+
+        return self._connection_pools[self.alias]
+
+    def record_connect (self, started) :
+        stats = self.connect_stats.setdefault(self.alias, { 'connects': 0, 'connect_seconds': 0.0 })
+        stats['connects'] += 1
+        stats['connect_seconds'] += time.perf_counter() - started
+
+    def get_new_connection (self, conn_params) :
+        started = time.perf_counter()
+        pool = self.pool
+
+        if pool is None :
+            connection = super().get_new_connection(conn_params)
+            self.record_connect(started)
+            return connection
+
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = IsolationLevel(isolation_level) if isolation_level is not None else IsolationLevel.READ_COMMITTED
+        connection = pool.getconn()
+
+        if isolation_level is not None :
+            connection.isolation_level = self.isolation_level
+
+        self.record_connect(started)
+        return connection
+
+    def _close (self) :
+        if self.connection is not None and self.pool is not None :
+            # back to the pool, which rolls back anything left open and drops broken connections
+            with self.wrap_database_errors :
+                self.connection._pool.putconn(self.connection)
+                self.connection = None
+            return
+
+        return super()._close()
+
+    def pool_stats (self) :
+        # psycopg_pool counters: requests_num are checkouts, requests_wait_ms waits, connections_ms handshakes
+        pool = self._connection_pools.get(self.alias)
+        return pool.get_stats() if pool is not None else {}
@@ -46,23 +46,93 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "main_app.instrumentation.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "main_app.routers.DatabaseRoutingMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "main_app.middleware.HouseholdMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# seconds a resolved household may be reused within one process, 0 disables. a change or delete is
+# only forgotten by the process that made it, other workers serve the old household until the ttl ends
+HOUSEHOLD_CACHE_TTL = int(os.getenv("HOUSEHOLD_CACHE_TTL", 0))
+
+# sessions only carry the household and member ids, so they live in the "sessions" cache and a
+# request reads them without a database query. SESSION_CACHE_URL shares one redis between processes.
+# without it each process keeps its own cache, so more than one worker refuses to start, and a
+# single one writes django_session as it saves and reads it back on a cache miss, as cached_db does
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "main_app.sessions")
+SESSION_CACHE_ALIAS = "sessions"
+SESSION_CACHE_SHARED = bool(os.getenv("SESSION_CACHE_URL"))
+# worker processes serving this settings module, as gunicorn reads it
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+# with a shared cache, copy sessions to django_session from a background thread. the copies changed
+# since the last flush are lost if the process exits without running atexit (SIGKILL, a crash,
+# os._exit), and only matter once redis has also lost those sessions
+SESSION_WRITE_BEHIND = os.getenv("SESSION_WRITE_BEHIND", "1") == "1"
+# seconds between background flushes of changed sessions to the database
+SESSION_WRITE_BEHIND_INTERVAL = float(os.getenv("SESSION_WRITE_BEHIND_INTERVAL", 1))
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sessions": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("SESSION_CACHE_URL"),
+        }
+        if os.getenv("SESSION_CACHE_URL")
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "sessions",
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("SESSION_CACHE_MAX_ENTRIES", 100000))},
+        }
+    ),
+}
+
+# seconds a rendered list fragment is kept, fragments are keyed on the household data version
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", 60 * 60))
+
+# pushes item changes to list pages open through asgi.py. the in process broker only reaches
+# clients of the worker that made the change, main_app.live.PostgresBroker reaches every worker
+LIVE_UPDATES_BROKER = os.getenv("LIVE_UPDATES_BROKER", "main_app.live.InProcessBroker")
+LIVE_UPDATES_PATH = "/live"
+# changes within this many seconds go out to a client as one batch, the latest state per item
+LIVE_UPDATES_COALESCE_SECONDS = float(os.getenv("LIVE_UPDATES_COALESCE_SECONDS", 0.25))
+# an idle SSE stream gets a comment line this often so proxies keep it open
+LIVE_UPDATES_KEEPALIVE_SECONDS = float(os.getenv("LIVE_UPDATES_KEEPALIVE_SECONDS", 15))
+
+# seconds a delta sync token stays usable, older ones get a full resync. tombstones of deletes are
+# kept a day longer, see the prune_tombstones command
+SYNC_TOKEN_MAX_AGE = int(os.getenv("SYNC_TOKEN_MAX_AGE", 30 * 24 * 60 * 60))
+
+# addresses allowed to scrape /metrics
+INTERNAL_IPS = [ip for ip in os.getenv('INTERNAL_IPS', '127.0.0.1').split(',') if ip]
+
 ROOT_URLCONF = "grocery_list.urls"
 
+# used instead of ROOT_URLCONF for requests served through asgi.py, empty to serve the sync views
+ASYNC_ROOT_URLCONF = os.getenv("ASYNC_ROOT_URLCONF", "grocery_list.async_urls")
+
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "main_app.instrumentation.InstrumentedTemplates",
         "DIRS": [],
-        "APP_DIRS": True,
         "OPTIONS": {
+            # templates are compiled once per process, the autoreloader resets them in development
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -76,21 +146,68 @@ TEMPLATES = [
 WSGI_APPLICATION = "grocery_list.wsgi.application"
 
 
+# per-request query and render stats, one json line per request
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "main_app.performance": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# connections come from a per-process pool (grocery_list/db/postgresql), so each
+# request skips the tcp and tls handshake; CONN_MAX_AGE 0 hands them back after every request
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'grocery_list.db.postgresql',
         'NAME': os.getenv('NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('PASSWORD'),
         'HOST': os.getenv('HOST'),
         'PORT': '5432',
-        'OPTIONS': {'sslmode': 'require'}
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'sslmode': 'require',
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 30 * 60)),
+                'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 5 * 60)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            },
+        },
     }
 }
 
+# an optional streaming replica of the default database, same credentials on another host
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "TEST": {"MIRROR": "default"},
+    }
+
+# main_app rows live on the shard picked by their household id, contrib tables stay on default.
+# for local testing add more aliases to DATABASES (sqlite files work), list them here and
+# migrate each one with --database
+DATABASE_ROUTERS = ["main_app.routers.HouseholdRouter"]
+DATABASE_SHARDS = ["default"]
+
+# read only copies of each shard, used by views with replica_reads = True. each one is a TEST MIRROR
+# of its shard; with sqlite, give the shard a file TEST NAME so the mirror can open it
+DATABASE_REPLICAS = {"default": ["replica"]} if "replica" in DATABASES else {}
+
+# seconds a client reads from the primary after its own write, covers replica lag
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -110,6 +227,11 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# passcode and password checks run on a small bounded thread pool
+PASSWORD_HASHER_WORKERS = 2
+PASSWORD_HASHER_MAX_PENDING = 32
+PASSWORD_HASHER_TIMEOUT = 5
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
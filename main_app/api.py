@@ -0,0 +1,227 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.db.models import Count, Max
+from django.http import JsonResponse, Http404
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.http import condition
+
+from .cache import get_household_version
+from .edits import ItemEditError, parse_item_edits, apply_item_edits
+from .middleware import get_household
+from .models import Store, Item
+from .pagination import KeysetPaginator
+from .prices import get_cheapest_prices
+from .search import search_items, autocomplete, SEARCH_LIMIT, AUTOCOMPLETE_LIMIT
+from .sync import SyncTokenError, SyncTokenExpired, changes_since
+
+API_PAGE_SIZE = 100
+
+HOUSEHOLD_FIELDS = ['id', 'street_address', 'city', 'state', 'zip_code', 'created_at']
+STORE_FIELDS = ['id', 'name', 'street_address', 'city', 'state', 'zip_code', 'created_at', 'updated_at']
+STORE_SUMMARY_FIELDS = ['id', 'name', 'item_count', 'low_stock_count', 'restock_cost']
+ITEM_FIELDS = [
+    'id', 'store_id', 'name', 'description', 'price', 'unit', 'current_stock', 'ideal_stock',
+    'minimum_stock', 'average_usage', 'version', 'created_at', 'updated_at',
+]
+
+def serialize (obj, fields) :
+    return { field: getattr(obj, field) for field in fields }
+
+def version_tag (count, updated_at) :
+    return f'{count}-{int(updated_at.timestamp() * 1000000) if updated_at else 0}'
+
+def list_version (request, key, queryset) :
+    # (row count, newest updated_at) in one indexed aggregate, memoised per request
+    versions = request.__dict__.setdefault('_api_versions', {})
+
+    if key not in versions :
+        versions[key] = queryset.aggregate(count = Count('id'), updated_at = Max('updated_at'))
+
+    return versions[key]
+
+def api_store (request, store_id) :
+    stores = request.__dict__.setdefault('_api_stores', {})
+
+    if store_id not in stores :
+        stores[store_id] = Store.objects.filter(id = store_id, household = request.household).first()
+
+    if stores[store_id] is None :
+        raise Http404('Store not found')
+
+    return stores[store_id]
+
+def api_item (request, store_id, item_id) :
+    if not hasattr(request, '_api_item') :
+        request._api_item = Item.objects.filter(id = item_id, store = store_id, store__household = request.household).first()
+
+    if request._api_item is None :
+        raise Http404('Item not found')
+
+    return request._api_item
+
+def stores_queryset (request) :
+    return Store.objects.filter(household = request.household)
+
+def items_queryset (request, store_id) :
+    return Item.objects.filter(store = api_store(request, store_id).id)
+
+def household_etag (request) :
+    payload = json.dumps(serialize(request.household, HOUSEHOLD_FIELDS), default = str, sort_keys = True)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+def store_list_etag (request) :
+    version = list_version(request, 'stores', stores_queryset(request))
+    return 'stores-' + version_tag(version['count'], version['updated_at'])
+
+def item_list_etag (request, store_id) :
+    version = list_version(request, f'items-{store_id}', items_queryset(request, store_id))
+    return f'items-{store_id}-' + version_tag(version['count'], version['updated_at'])
+
+def store_summary_etag (request) :
+    # summaries move with any item write, which bumps the household data version
+    return f'store-summary-{request.household.id}-{get_household_version(request.household.id)}'
+
+def cheapest_prices_etag (request) :
+    return f'cheapest-prices-{request.household.id}-{get_household_version(request.household.id)}'
+
+def item_etag (request, store_id, item_id) :
+    item = api_item(request, store_id, item_id)
+    return f'item-{item.id}-' + version_tag(1, item.updated_at)
+
+def item_modified (request, store_id, item_id) :
+    return api_item(request, store_id, item_id).updated_at
+
+
+class ApiHouseholdRequiredMixin :
+    # api clients get a 401 instead of the login redirect
+
+    def dispatch (self, request, *args, **kwargs) :
+        if get_household(request) is None :
+            return JsonResponse({ 'error': 'Household not found' }, status = 401)
+
+        return super().dispatch(request, *args, **kwargs)
+
+
+class HouseholdDetail (ApiHouseholdRequiredMixin, View) :
+    @method_decorator(condition(etag_func = household_etag))
+    def get (self, request, *args, **kwargs) :
+        return JsonResponse(serialize(request.household, HOUSEHOLD_FIELDS))
+
+class StoreList (ApiHouseholdRequiredMixin, View) :
+    # etag only, a delete leaves the newest updated_at where it was but changes the count
+    @method_decorator(condition(etag_func = store_list_etag))
+    def get (self, request, *args, **kwargs) :
+        stores = stores_queryset(request).order_by('name').values(*STORE_FIELDS)
+        return JsonResponse({ 'stores': list(stores) })
+
+class StoreSummary (ApiHouseholdRequiredMixin, View) :
+    @method_decorator(condition(etag_func = store_summary_etag))
+    def get (self, request, *args, **kwargs) :
+        stores = list(stores_queryset(request).with_summary().order_by('name').values(*STORE_SUMMARY_FIELDS))
+
+        # sqlite hands computed decimals back unscaled
+        for store in stores :
+            store['restock_cost'] = Decimal(store['restock_cost']).quantize(Decimal('0.01'))
+
+        return JsonResponse({ 'stores': stores })
+
+class CheapestPrices (ApiHouseholdRequiredMixin, View) :
+    @method_decorator(condition(etag_func = cheapest_prices_etag))
+    def get (self, request, *args, **kwargs) :
+        return JsonResponse({ 'prices': get_cheapest_prices(request.household.id) })
+
+class ItemList (ApiHouseholdRequiredMixin, View) :
+    @method_decorator(condition(etag_func = item_list_etag))
+    def get (self, request, store_id, *args, **kwargs) :
+        paginator = KeysetPaginator(items_queryset(request, store_id), API_PAGE_SIZE)
+        page = paginator.page(request.GET.get('cursor'))
+
+        return JsonResponse({
+            'items': [serialize(item, ITEM_FIELDS) for item in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        })
+
+    def patch (self, request, store_id, *args, **kwargs) :
+        # {"items": [{"id": 1, "version": 3, "name": ...}]}, stale edits are listed as conflicts, the rest apply
+        try :
+            data = json.loads(request.body)
+            edits = parse_item_edits(data.get('items') if isinstance(data, dict) else None)
+        except ValueError :
+            return JsonResponse({ 'error': 'Invalid JSON' }, status = 400)
+        except ItemEditError as error :
+            return JsonResponse({ 'error': str(error) }, status = 400)
+
+        report = apply_item_edits(request.household, edits, store = api_store(request, store_id))
+        return JsonResponse(report.as_dict())
+
+class ItemDetail (ApiHouseholdRequiredMixin, View) :
+    @method_decorator(condition(etag_func = item_etag, last_modified_func = item_modified))
+    def get (self, request, store_id, item_id, *args, **kwargs) :
+        return JsonResponse(serialize(api_item(request, store_id, item_id), ITEM_FIELDS))
+
+    def patch (self, request, store_id, item_id, *args, **kwargs) :
+        # {"version": 3, "name": ...}, 409 with a merge hint when the item has moved past version
+        try :
+            data = json.loads(request.body)
+        except ValueError :
+            return JsonResponse({ 'error': 'Invalid JSON' }, status = 400)
+
+        if not isinstance(data, dict) :
+            return JsonResponse({ 'error': 'Expected an object of item fields' }, status = 400)
+
+        try :
+            edits = parse_item_edits([{ **data, 'id': item_id }])
+        except ItemEditError as error :
+            return JsonResponse({ 'error': str(error) }, status = 400)
+
+        report = apply_item_edits(request.household, edits, store = api_store(request, store_id))
+
+        if report.missing :
+            raise Http404('Item not found')
+
+        if report.conflicts :
+            return JsonResponse({ 'error': 'Item was changed by someone else', 'conflict': report.conflicts[0] }, status = 409)
+
+        if report.errors :
+            return JsonResponse({ 'errors': report.errors[item_id] }, status = 400)
+
+        return JsonResponse({ 'id': item_id, 'version': report.updated[item_id] })
+
+def limit_param (request, default) :
+    try :
+        return max(1, min(int(request.GET.get('limit', default)), 100))
+    except ValueError :
+        return default
+
+class ItemSearch (ApiHouseholdRequiredMixin, View) :
+    def get (self, request, *args, **kwargs) :
+        results = search_items(request.household.id, request.GET.get('q', ''), limit_param(request, SEARCH_LIMIT))
+        return JsonResponse({ 'results': results })
+
+class ItemAutocomplete (ApiHouseholdRequiredMixin, View) :
+    def get (self, request, *args, **kwargs) :
+        names = autocomplete(request.household.id, request.GET.get('q', ''), limit_param(request, AUTOCOMPLETE_LIMIT))
+        return JsonResponse({ 'names': names })
+
+class Changes (ApiHouseholdRequiredMixin, View) :
+    # ?since=<token> from the last response, without one the whole household is sent.
+    # follow the returned token while "more" is true, then keep it for the next sync
+    def get (self, request, *args, **kwargs) :
+        try :
+            changes = changes_since(request.household, request.GET.get('since'))
+        except SyncTokenExpired as error :
+            return JsonResponse({ 'error': str(error), 'reset': True }, status = 410)
+        except SyncTokenError as error :
+            return JsonResponse({ 'error': str(error) }, status = 400)
+
+        return JsonResponse({
+            'stores': [serialize(store, STORE_FIELDS) for store in changes['stores']],
+            'items': [serialize(item, ITEM_FIELDS) for item in changes['items']],
+            'deleted': changes['deleted'],
+            'token': changes['token'],
+            'more': changes['more'],
+        })
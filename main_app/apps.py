@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class MainAppConfig (AppConfig) :
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "main_app"
+
+    def ready (self) :
+        from . import signals, instrumentation
+        from .sessions import check_session_cache
+
+        check_session_cache()
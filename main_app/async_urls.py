@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# same routes as urls.py, with the read paths swapped for their async versions
+ASYNC_VIEWS = {
+    'household_select': async_views.HouseholdSelect,
+    'member_select': async_views.MemberSelect,
+    'store_list': async_views.StoreList,
+    'item_list': async_views.StoreItemList,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name = pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
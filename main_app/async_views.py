@@ -0,0 +1,139 @@
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
+from django.views import View
+from django.contrib import messages
+from django.core.paginator import Paginator, InvalidPage
+from django.db import connections
+from django.http import Http404
+
+from . import views
+from .cache import aget_household_version, fragment_context
+from .hashers import VerificationBusy
+from .middleware import AsyncHouseholdRequiredMixin, asession
+from .models import Store, Item
+from .routers import afind_household
+from .pagination import KeysetPaginator, aestimate_count
+
+# async twins of the read paths, served under asgi through main_app.async_urls
+
+class HouseholdSelect (View) :
+    form_class = views.HouseholdSelect.form_class
+    template_name = views.HouseholdSelect.template_name
+
+    async def get (self, request, *args, **kwargs) :
+        return render(request, self.template_name, { 'form': self.form_class() })
+
+    async def post (self, request, *args, **kwargs) :
+        form = self.form_class(request.POST)
+
+        if form.is_valid() :
+            household = await afind_household(
+                street_address = form.cleaned_data['street_address'],
+                city = form.cleaned_data['city'],
+                state = form.cleaned_data['state'],
+                zip_code = form.cleaned_data['zip_code']
+            )
+
+            try :
+                # the kdf runs on the hasher pool, a possible rehash save needs the sync thread
+                if household and await sync_to_async(household.verify_passcode)(form.cleaned_data['passcode']) :
+                    (await asession(request))['household'] = household.id
+                    return redirect(household.get_absolute_url())
+
+                else :
+                    messages.error(request, 'Invalid address or passcode. Please try again')
+
+            except VerificationBusy :
+                messages.error(request, 'Too many sign ins right now. Please try again')
+
+        return render(request, self.template_name, { 'form': form })
+
+class MemberSelect (AsyncHouseholdRequiredMixin, View) :
+    template_name = views.MemberSelect.template_name
+    replica_reads = views.MemberSelect.replica_reads
+
+    async def get (self, request, *args, **kwargs) :
+        members = [member async for member in request.household.members.all()]
+
+        if not members :
+            return redirect('member_create')
+
+        return render(request, self.template_name, { 'members': members })
+
+    async def post (self, request, *args, **kwargs) :
+        # password checks are cpu bound, the sync view already hands them to the hasher pool
+        return await sync_to_async(views.MemberSelect.as_view())(request, *args, **kwargs)
+
+class StoreList (AsyncHouseholdRequiredMixin, View) :
+    template_name = views.StoreList.template_name
+    replica_reads = views.StoreList.replica_reads
+
+    async def get (self, request, *args, **kwargs) :
+        # the version before the rows, as in views.StoreList
+        version = await aget_household_version(request.household.id)
+        stores = [store async for store in request.household.stores.with_summary()]
+
+        if not stores :
+            return redirect('store_create')
+
+        return render(request, self.template_name, {
+            'stores': stores,
+            'fragment': fragment_context(request.household.id, version),
+        })
+
+class StoreItemList (AsyncHouseholdRequiredMixin, View) :
+    template_name = views.StoreItemList.template_name
+    replica_reads = views.StoreItemList.replica_reads
+    paginate_by = views.StoreItemList.paginate_by
+    keyset_threshold = views.StoreItemList.keyset_threshold
+
+    async def get (self, request, *args, **kwargs) :
+        # the version before the rows, as in views.StoreList
+        self.version = await aget_household_version(request.household.id)
+        store = await Store.objects.filter(id = kwargs['store_id'], household = request.household).afirst()
+
+        if store is None :
+            raise Http404('Store not found')
+
+        queryset = Item.objects.filter(store = store.id).by_restock_urgency()
+        cursor = request.GET.get('cursor')
+        last = request.GET.get('last') is not None
+
+        if not cursor and not last :
+            page_number = request.GET.get('page')
+            estimated_count = None if page_number else await aestimate_count(queryset)
+
+            if page_number or estimated_count <= self.keyset_threshold :
+                # off postgres the estimate is an exact count, no need to count twice
+                known_count = estimated_count if connections[queryset.db].vendor != 'postgresql' else None
+                return await self.offset_page(request, store, queryset, page_number or 1, known_count)
+
+        else :
+            estimated_count = await aestimate_count(queryset) if request.GET.get('count') else None
+
+        paginator = KeysetPaginator(queryset, self.paginate_by, estimated_count = estimated_count)
+        page = await paginator.apage(cursor, last = last)
+        return await self.render_page(request, store, paginator, page)
+
+    async def offset_page (self, request, store, queryset, page_number, known_count = None) :
+        paginator = Paginator(queryset, self.paginate_by)
+        paginator.count = known_count if known_count is not None else await queryset.acount()
+
+        try :
+            page = paginator.page(paginator.num_pages if page_number == 'last' else page_number)
+        except InvalidPage :
+            raise Http404('Invalid page')
+
+        page.object_list = [item async for item in page.object_list]
+        return await self.render_page(request, store, paginator, page)
+
+    async def render_page (self, request, store, paginator, page) :
+        return render(request, self.template_name, {
+            'fragment': fragment_context(request.household.id, self.version),
+            'store': store,
+            'items': page.object_list,
+            'object_list': page.object_list,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+        })
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+# the household data version is a column on the household row, so every process keys its cached
+# fragments and lists on the same one. it is read with the data it versions, from the same database
+
+def household_versions (household_id) :
+    from .models import Household
+
+    return Household.objects.filter(id = household_id).values_list('data_version', flat = True)
+
+def get_household_version (household_id) :
+    return household_versions(household_id).first()
+
+async def aget_household_version (household_id) :
+    return await household_versions(household_id).afirst()
+
+def fragment_context (household_id, version) :
+    # vary_on values for {% cache %}, a bumped version makes every old fragment unreachable
+    return { 'timeout': settings.FRAGMENT_CACHE_TIMEOUT, 'household': household_id, 'version': version }
+
+def bump_household_versions (household_ids, using) :
+    # every cached value keyed on the old version is now unreachable. bumped once the write has
+    # committed, a reader that took the new version before then could cache the old rows under it
+    household_ids = { household_id for household_id in household_ids if household_id }
+
+    if household_ids :
+        connection = transaction.get_connection(using)
+        connection.__dict__.setdefault('household_version_bumps', set()).update(household_ids)
+        transaction.on_commit(lambda : flush_household_versions(using), using = using)
+
+def flush_household_versions (using) :
+    # one UPDATE per commit however many writes asked for a bump, the first callback to run takes
+    # every household queued so far and the rest find nothing left. a household queued in a rolled
+    # back savepoint is bumped anyway, an extra bump only costs a cache miss
+    from .models import Household
+
+    connection = transaction.get_connection(using)
+    household_ids = connection.__dict__.pop('household_version_bumps', set())
+
+    if household_ids :
+        Household.objects.using(using).filter(id__in = household_ids).update(data_version = F('data_version') + 1)
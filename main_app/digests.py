@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import Item, LowStockDigest, JobCheckpoint, NEEDS_RESTOCK
+
+DIGEST_JOB = 'low_stock_digest'
+DIGEST_BATCH_SIZE = 500
+# updated_at is stamped before a write commits, so each window stops this far short of now
+DIGEST_SETTLE_SECONDS = 60
+
+DIGEST_FIELDS = ['id', 'name', 'unit', 'current_stock', 'minimum_stock', 'ideal_stock', 'store_id', 'store__name', 'store__household_id']
+
+def changed_items (since, until) :
+    # a range over item_restock_updated_idx, items that are fine or unchanged are never read
+    items = Item.objects.filter(NEEDS_RESTOCK, updated_at__lte = until)
+
+    if since is not None :
+        items = items.filter(updated_at__gt = since)
+
+    return items
+
+def household_batches (since, until, batch_size) :
+    # households with changed items, keyset paged on household id
+    last_id = 0
+
+    while True :
+        household_ids = list(
+            changed_items(since, until)
+            .filter(store__household__gt = last_id)
+            .order_by('store__household')
+            .values_list('store__household', flat = True)
+            .distinct()[:batch_size]
+        )
+
+        if not household_ids :
+            return
+
+        yield household_ids
+        last_id = household_ids[-1]
+
+def build_digests (household_ids, since, until) :
+    rows = (
+        changed_items(since, until)
+        .filter(store__household__in = household_ids)
+        .order_by('store__household', 'store__name', 'name', 'id')
+        .values(*DIGEST_FIELDS)
+    )
+    digests = {}
+
+    for row in rows :
+        household_id = row['store__household_id']
+
+        if household_id not in digests :
+            digests[household_id] = LowStockDigest(household_id = household_id, window_start = since, window_end = until, items = [])
+
+        digests[household_id].items.append({
+            'id': row['id'],
+            'name': row['name'],
+            'unit': row['unit'],
+            'store_id': row['store_id'],
+            'store': row['store__name'],
+            'current_stock': row['current_stock'],
+            'minimum_stock': row['minimum_stock'],
+            'ideal_stock': row['ideal_stock'],
+            'reorder_quantity': max(row['ideal_stock'] - row['current_stock'], 0),
+        })
+
+    return list(digests.values())
+
+def start_window (now, settle_seconds) :
+    # an unfinished run's window is resumed as is, so its digests are not written twice
+    with transaction.atomic(using = router.db_for_write(JobCheckpoint)) :
+        checkpoint, created = JobCheckpoint.objects.select_for_update().get_or_create(name = DIGEST_JOB)
+
+        if checkpoint.pending_position is None :
+            checkpoint.pending_position = now - timedelta(seconds = settle_seconds)
+            checkpoint.save(update_fields = ['pending_position', 'updated_at'])
+
+        return checkpoint.position, checkpoint.pending_position
+
+def finish_window (until) :
+    JobCheckpoint.objects.filter(name = DIGEST_JOB, pending_position = until).update(
+        position = until, pending_position = None, updated_at = timezone.now()
+    )
+
+def run_digest (batch_size = DIGEST_BATCH_SIZE, settle_seconds = DIGEST_SETTLE_SECONDS, now = None) :
+    since, until = start_window(now or timezone.now(), settle_seconds)
+    report = { 'since': since, 'until': until, 'households': 0, 'items': 0 }
+
+    if since is not None and until <= since :
+        finish_window(until)
+        return report
+
+    for household_ids in household_batches(since, until, batch_size) :
+        digests = build_digests(household_ids, since, until)
+
+        # a concurrent or repeated run of the same window hits the unique constraint and skips
+        LowStockDigest.objects.bulk_create(digests, ignore_conflicts = True)
+        report['households'] += len(digests)
+        report['items'] += sum(len(digest.items) for digest in digests)
+
+    finish_window(until)
+    return report
+
+def reset_digest () :
+    # the next run starts from scratch and reports every item that needs restocking
+    JobCheckpoint.objects.filter(name = DIGEST_JOB).delete()
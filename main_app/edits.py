@@ -0,0 +1,127 @@
+from django.db import router, transaction
+from django.utils import timezone
+
+from .forms import ItemCreateForm
+from .live import LIVE_FIELDS, publish_item_changes
+from .models import Item
+
+MAX_ITEM_EDITS = 500
+EDIT_FIELDS = ['name', 'description', 'price', 'unit', 'current_stock', 'ideal_stock', 'minimum_stock']
+
+class ItemEditError (Exception) :
+    pass
+
+def parse_item_edits (data) :
+    # [{"id": 1, "version": 3, "name": ..., ...}], each edit names the version it was made against
+    if not isinstance(data, list) :
+        raise ItemEditError('Expected a list of item edits')
+
+    if len(data) > MAX_ITEM_EDITS :
+        raise ItemEditError(f'At most {MAX_ITEM_EDITS} items can be edited at once')
+
+    edits = {}
+
+    for edit in data :
+        if not isinstance(edit, dict) :
+            raise ItemEditError('Each edit must be an object')
+
+        for key in ['id', 'version'] :
+            if isinstance(edit.get(key), bool) or not isinstance(edit.get(key), int) :
+                raise ItemEditError(f'Each edit needs a whole number {key}')
+
+        unknown = set(edit) - set(EDIT_FIELDS) - { 'id', 'version' }
+
+        if unknown :
+            raise ItemEditError(f'Fields that cannot be edited: {", ".join(sorted(unknown))}')
+
+        edits[edit['id']] = (edit['version'], { field: edit[field] for field in EDIT_FIELDS if field in edit })
+
+    return edits
+
+def item_state (item) :
+    return { 'id': item.id, 'version': item.version, **{ field: getattr(item, field) for field in EDIT_FIELDS } }
+
+def clean_edit (current, changes) :
+    # the edit applied to the row it was made against, with the item create page's checks
+    form = ItemCreateForm(data = { **{ field: current[field] for field in EDIT_FIELDS }, **changes })
+
+    if not form.is_valid() :
+        return None, { field: list(errors) for field, errors in form.errors.items() }
+
+    return { field: form.cleaned_data[field] for field in changes }, None
+
+def merge_hint (item_id, version, changes, current) :
+    # enough for a client to rebase without reading the item again: the row as it is now, and which
+    # of its changes collide with it. the rest can be sent again as they are, at current['version']
+    return {
+        'id': item_id,
+        'version': version,
+        'current': current,
+        'conflicting_fields': sorted(field for field, value in changes.items() if current[field] != value),
+    }
+
+
+class ItemEditReport :
+    def __init__ (self) :
+        self.updated = {}
+        self.conflicts = []
+        self.errors = {}
+        self.missing = []
+
+    def as_dict (self) :
+        return { 'updated': self.updated, 'conflicts': self.conflicts, 'errors': self.errors, 'missing': self.missing }
+
+
+def apply_item_edits (household, edits, store = None) :
+    # optimistic: rows are read, checked and written with a compare and swap on their version, so
+    # an edit held in a form for minutes never locks anything and a stale one is reported, not applied
+    report = ItemEditReport()
+
+    if not edits :
+        return report
+
+    items = Item.objects.filter(household = household, id__in = edits.keys())
+
+    if store is not None :
+        items = items.filter(store = store)
+
+    current = { item.id: item_state(item) for item in items }
+    store_ids = { item.id: item.store_id for item in items }
+    report.missing = sorted(set(edits) - set(current))
+    valid = {}
+
+    for item_id, (version, changes) in edits.items() :
+        if item_id not in current :
+            continue
+
+        cleaned, errors = clean_edit(current[item_id], changes)
+
+        if current[item_id]['version'] != version :
+            report.conflicts.append(merge_hint(item_id, version, cleaned or changes, current[item_id]))
+        elif errors :
+            report.errors[item_id] = errors
+        else :
+            valid[item_id] = (version, cleaned)
+
+    updated_at = timezone.now()
+
+    with transaction.atomic(using = router.db_for_write(Item)) :
+        written = items.compare_and_swap(valid, updated_at = updated_at)
+        lost = sorted(set(valid) - written)
+
+        # written by someone else between the read above and the swap, read again for the hints
+        if lost :
+            for item in Item.objects.filter(id__in = lost) :
+                report.conflicts.append(merge_hint(item.id, *valid[item.id], item_state(item)))
+
+        changes = []
+
+        for item_id in sorted(written) :
+            version, cleaned = valid[item_id]
+            report.updated[item_id] = version + 1
+            item = { **current[item_id], **cleaned, 'version': version + 1, 'store_id': store_ids[item_id], 'updated_at': updated_at }
+            changes.append({ field: item[field] for field in LIVE_FIELDS })
+
+        publish_item_changes(household.id, changes)
+
+    return report
@@ -0,0 +1,48 @@
+import csv
+import json
+
+from .models import Item
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    'store_id', 'store_name', 'id', 'name', 'description', 'price', 'unit',
+    'current_stock', 'ideal_stock', 'minimum_stock', 'average_usage', 'created_at',
+]
+
+def iter_inventory (household_id, chunk_size = EXPORT_CHUNK_SIZE) :
+    # flat rows with the store name joined in, read through a server side cursor
+    return Item.objects.filter(store__household = household_id).order_by('store_id', 'id').values_list(
+        'store_id', 'store__name', 'id', 'name', 'description', 'price', 'unit',
+        'current_stock', 'ideal_stock', 'minimum_stock', 'average_usage', 'created_at',
+    ).iterator(chunk_size = chunk_size)
+
+
+class Echo :
+    # csv.writer target that hands each line back instead of buffering it
+    def write (self, value) :
+        return value
+
+
+def iter_csv (rows) :
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+
+    for row in rows :
+        yield writer.writerow(row)
+
+def iter_ndjson (rows) :
+    for row in rows :
+        record = dict(zip(EXPORT_FIELDS, row))
+        record['price'] = str(record['price'])
+        record['created_at'] = record['created_at'].isoformat()
+        yield json.dumps(record) + '\n'
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
+
+def export_inventory (household_id, format, chunk_size = EXPORT_CHUNK_SIZE) :
+    render, content_type = EXPORT_FORMATS[format]
+    return render(iter_inventory(household_id, chunk_size)), content_type
@@ -86,6 +86,10 @@ class ItemCreateForm (forms.ModelForm) :
     def clean (self) :
         cleaned_data = super().clean()
 
+        # field errors are already reported, and the checks below need every field
+        if self.errors :
+            return cleaned_data
+
         for field in ['name', 'description', 'unit'] :
             cleaned_data[field] = cleaned_data[field].strip().lower()
 
@@ -102,3 +106,7 @@ class ItemCreateForm (forms.ModelForm) :
 
         return cleaned_data
 
+
+class ItemImportForm (forms.Form) :
+    file = forms.FileField(label = 'File')
+    format = forms.ChoiceField(choices = [('csv', 'CSV'), ('json', 'JSON')], label = 'Format')
@@ -0,0 +1,81 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, check_password
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationBusy (Exception) :
+    pass
+
+
+class HasherPool :
+    # kdf work runs on a few dedicated threads (hashlib drops the gil), and
+    # callers beyond max_pending are turned away instead of piling up
+
+    def __init__ (self, workers, max_pending, timeout) :
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor = None
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.counters = { 'submitted': 0, 'completed': 0, 'rejected': 0, 'max_queue_depth': 0 }
+
+    def run (self, func, *args) :
+        if not self.slots.acquire(timeout = self.timeout) :
+            with self.lock :
+                self.counters['rejected'] += 1
+
+            logger.warning('password hasher pool saturated', extra = self.stats())
+            raise VerificationBusy()
+
+        try :
+            with self.lock :
+                if self.executor is None :
+                    self.executor = ThreadPoolExecutor(max_workers = self.workers, thread_name_prefix = 'hasher')
+
+                self.pending += 1
+                self.counters['submitted'] += 1
+                self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], self.pending)
+
+            return self.executor.submit(func, *args).result()
+
+        finally :
+            with self.lock :
+                self.pending -= 1
+                self.counters['completed'] += 1
+
+            self.slots.release()
+
+    def stats (self) :
+        with self.lock :
+            return {
+                'workers': self.workers,
+                'queue_depth': max(self.pending - self.workers, 0),
+                'in_flight': self.pending,
+                **self.counters,
+            }
+
+
+pool = HasherPool(
+    workers = getattr(settings, 'PASSWORD_HASHER_WORKERS', 2),
+    max_pending = getattr(settings, 'PASSWORD_HASHER_MAX_PENDING', 32),
+    timeout = getattr(settings, 'PASSWORD_HASHER_TIMEOUT', 5),
+)
+
+def check_secret (raw_secret, encoded) :
+    # returns (valid, needs_rehash), the rehash itself happens on the caller's thread
+    outdated = []
+    valid = check_password(raw_secret, encoded, setter = lambda raw : outdated.append(True))
+    return valid, bool(outdated)
+
+def verify_secret (raw_secret, encoded) :
+    return pool.run(check_secret, raw_secret, encoded)
+
+def hash_secret (raw_secret) :
+    return pool.run(make_password, raw_secret)
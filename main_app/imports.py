@@ -0,0 +1,128 @@
+import codecs
+import csv
+import json
+
+from django.db import router, transaction
+
+from .forms import ItemCreateForm
+from .models import Item
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+MAX_JSON_ROW_SIZE = 1024 * 1024
+
+def text_stream (stream) :
+    # uploaded files and files opened in binary mode yield bytes
+    sample = stream.read(0)
+    return codecs.getreader('utf-8-sig')(stream) if isinstance(sample, bytes) else stream
+
+def iter_csv_rows (stream) :
+    yield from csv.DictReader(text_stream(stream))
+
+def iter_json_rows (stream) :
+    # accepts a top level array or one object per line, holding at most one object plus a chunk in memory
+    stream = text_stream(stream)
+    decoder = json.JSONDecoder()
+    buffer = ''
+    exhausted = False
+
+    while True :
+        buffer = buffer.lstrip(' \t\r\n,[]')
+
+        if buffer :
+            try :
+                row, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError :
+                if exhausted or len(buffer) > MAX_JSON_ROW_SIZE :
+                    raise ValueError('Invalid JSON near: ' + buffer[:40])
+            else :
+                # a number or literal may have been cut off at the chunk boundary
+                if end < len(buffer) or exhausted or isinstance(row, (dict, list)) :
+                    buffer = buffer[end:]
+                    yield row
+                    continue
+
+        if exhausted :
+            return
+
+        chunk = stream.read(JSON_CHUNK_SIZE)
+        exhausted = not chunk
+        buffer += chunk
+
+def iter_rows (stream, format) :
+    if format == 'csv' :
+        return iter_csv_rows(stream)
+
+    if format == 'json' :
+        return iter_json_rows(stream)
+
+    raise ValueError(f'Unsupported import format: {format}')
+
+def clean_row (row) :
+    # same normalization and checks as the item create page
+    if not isinstance(row, dict) :
+        return None, { '__all__': ['Each row must be an object'] }
+
+    form = ItemCreateForm(data = { key: '' if value is None else value for key, value in row.items() })
+
+    if not form.is_valid() :
+        return None, { field: list(errors) for field, errors in form.errors.items() }
+
+    item = form.save(commit = False)
+    item.normalize()
+    return item, None
+
+
+class ImportReport :
+    def __init__ (self) :
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    @property
+    def truncated (self) :
+        return self.failed > len(self.errors)
+
+    def add_error (self, row_number, errors) :
+        self.failed += 1
+
+        if len(self.errors) < MAX_REPORTED_ERRORS :
+            self.errors.append({ 'row': row_number, 'errors': errors })
+
+    def as_dict (self) :
+        return { 'created': self.created, 'failed': self.failed, 'errors': self.errors, 'truncated': self.truncated }
+
+
+def import_items (store, stream, format, batch_size = IMPORT_BATCH_SIZE) :
+    report = ImportReport()
+    batch = []
+
+    def flush () :
+        with transaction.atomic(using = router.db_for_write(Item)) :
+            Item.objects.bulk_create(batch, batch_size = batch_size)
+
+        report.created += len(batch)
+        batch.clear()
+
+    try :
+        for row_number, row in enumerate(iter_rows(stream, format), start = 1) :
+            item, errors = clean_row(row)
+
+            if errors :
+                report.add_error(row_number, errors)
+                continue
+
+            item.store = store
+            batch.append(item)
+
+            if len(batch) >= batch_size :
+                flush()
+
+    except (csv.Error, ValueError, UnicodeDecodeError) as error :
+        report.add_error(None, { '__all__': [str(error)] })
+
+    if batch :
+        flush()
+
+    return report
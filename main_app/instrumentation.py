@@ -0,0 +1,234 @@
+import contextvars
+import json
+import logging
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('main_app.performance')
+
+# most queries a GET of each named route may run, session and household lookups included
+QUERY_BUDGETS = {
+    'home': 0,
+    'metrics': 0,
+    'live_updates': 0,
+    'household_select': 0,
+    'household_create': 0,
+    'member_select': 3,
+    'member_create': 2,
+    'store_list': 3,
+    'store_create': 2,
+    'shopping_list': 3,
+    'cheapest_prices': 4,
+    'stock_update': 2,
+    'inventory_export': 3,
+    'item_list': 6,
+    'item_create': 3,
+    'item_import': 3,
+    'store_stock_update': 2,
+    'stock_event_create': 2,
+    'api_household': 2,
+    'api_store_list': 3,
+    'api_store_summary': 3,
+    'api_cheapest_prices': 4,
+    'api_changes': 4,
+    'api_item_search': 3,
+    'api_item_autocomplete': 3,
+    'api_item_list': 5,
+    'api_item_detail': 3,
+}
+# most queries each write may run for one posted row, session and household lookups and the
+# version bump after commit included. see QueryBudgetMixin.write_requests
+WRITE_QUERY_BUDGETS = {
+    ('POST', 'household_create'): 9,
+    ('POST', 'household_select'): 5,
+    ('POST', 'member_create'): 5,
+    ('POST', 'member_select'): 5,
+    ('POST', 'store_create'): 3,
+    ('POST', 'item_create'): 4,
+    ('POST', 'item_import'): 6,
+    ('POST', 'stock_update'): 9,
+    ('POST', 'store_stock_update'): 13,
+    ('POST', 'stock_event_create'): 6,
+    ('PATCH', 'api_item_list'): 8,
+    ('PATCH', 'api_item_detail'): 8,
+}
+
+_request_stats = contextvars.ContextVar('request_stats', default = None)
+_end = object()
+
+
+class RequestStats :
+    def __init__ (self) :
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def add_query (self, sql, params, seconds) :
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[sql] += 1
+
+        try :
+            self.executions[(sql, repr(params))] += 1
+        except Exception :
+            pass
+
+    @property
+    def duplicates (self) :
+        # the same statement with the same parameters, pure waste
+        return sum(count - 1 for count in self.executions.values() if count > 1)
+
+    @property
+    def similar (self) :
+        # the same statement with different parameters, the usual n+1 shape
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def server_timing (self, total_seconds) :
+        return ', '.join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries, {self.duplicates} duplicate, {self.similar} similar"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'total;dur={total_seconds * 1000:.1f}',
+        ])
+
+
+def record_query (execute, sql, params, many, context) :
+    stats = _request_stats.get()
+
+    if stats is None :
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+
+    try :
+        return execute(sql, params, many, context)
+    finally :
+        stats.add_query(sql, params, time.perf_counter() - started)
+
+@receiver(connection_created)
+def instrument_connection (sender, connection, **kwargs) :
+    # contextvars follow requests into sync_to_async threads, so one wrapper per connection is enough
+    if record_query not in connection.execute_wrappers :
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentedTemplate (Template) :
+    def render (self, context = None, request = None) :
+        stats = _request_stats.get()
+        started = time.perf_counter()
+
+        try :
+            return super().render(context, request)
+        finally :
+            if stats is not None :
+                stats.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedTemplates (DjangoTemplates) :
+    # DjangoTemplates whose top level renders are timed into the request stats
+
+    def from_string (self, template_code) :
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template (self, template_name) :
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+class QueryInstrumentationMiddleware :
+    # query count, db time, duplicates and template time per view, as Server-Timing and a log line
+    sync_capable = True
+    async_capable = True
+
+    def __init__ (self, get_response) :
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response) :
+            markcoroutinefunction(self)
+
+    def __call__ (self, request) :
+        if iscoroutinefunction(self) :
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        try :
+            response = self.get_response(request)
+        finally :
+            _request_stats.reset(token)
+
+        return self.finish(request, response, stats)
+
+    async def __acall__ (self, request) :
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        try :
+            response = await self.get_response(request)
+        finally :
+            _request_stats.reset(token)
+
+        return self.finish(request, response, stats)
+
+    def finish (self, request, response, stats) :
+        response['Server-Timing'] = stats.server_timing(time.perf_counter() - stats.started)
+
+        # a streamed body runs its queries after the view has returned, it is logged once fully sent
+        if response.streaming and not response.is_async :
+            response.streaming_content = self.counted_stream(request, response, stats, response.streaming_content)
+        else :
+            self.log(request, response, stats)
+
+        return response
+
+    def counted_stream (self, request, response, stats, content) :
+        # each chunk is made under the request's stats again, the body is read after __call__ returned
+        content = iter(content)
+
+        try :
+            while True :
+                token = _request_stats.set(stats)
+
+                try :
+                    chunk = next(content, _end)
+                finally :
+                    _request_stats.reset(token)
+
+                if chunk is _end :
+                    return
+
+                yield chunk
+        finally :
+            self.log(request, response, stats)
+
+    def log (self, request, response, stats) :
+        total_seconds = time.perf_counter() - stats.started
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        budget = QUERY_BUDGETS.get(view_name) if request.method in ('GET', 'HEAD') else WRITE_QUERY_BUDGETS.get((request.method, view_name))
+        record = {
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'db_ms': round(stats.db_seconds * 1000, 2),
+            'duplicate_queries': stats.duplicates,
+            'similar_queries': stats.similar,
+            'template_ms': round(stats.template_seconds * 1000, 2),
+            'total_ms': round(total_seconds * 1000, 2),
+        }
+
+        if budget is not None and stats.queries > budget :
+            logger.warning(json.dumps({ **record, 'query_budget': budget }))
+        else :
+            logger.info(json.dumps(record))
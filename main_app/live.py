@@ -0,0 +1,340 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections, router, transaction
+from django.http.cookie import parse_cookie
+from django.http.request import split_domain_port, validate_host
+from django.utils.http import is_same_domain
+from django.utils.module_loading import import_string
+
+from .routers import shards
+
+logger = logging.getLogger(__name__)
+
+LIVE_FIELDS = ['id', 'store_id', 'name', 'unit', 'current_stock', 'minimum_stock', 'ideal_stock', 'version', 'updated_at']
+NOTIFY_CHANNEL = 'grocery_item_changes'
+# postgres refuses NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7500
+LISTEN_RETRY_SECONDS = 5
+
+def item_change (item, deleted = False) :
+    # the few fields a list page shows, a client patches its rows with these. only fields already
+    # loaded are sent, reading a deferred one would cost a query per item
+    if deleted :
+        return { 'id': item.id, 'store_id': item.store_id, 'deleted': True }
+
+    return { field: item.__dict__[field] for field in LIVE_FIELDS if field in item.__dict__ }
+
+
+class Subscription :
+    # one connected client. changes that arrive while a batch is being collected are merged by
+    # item id, so a burst of writes to one item goes out as its latest state only
+
+    def __init__ (self, broker, household_id) :
+        self.broker = broker
+        self.household_id = household_id
+        self.loop = asyncio.get_running_loop()
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def deliver (self, changes) :
+        # called from whichever thread published
+        try :
+            self.loop.call_soon_threadsafe(self.merge, changes)
+        except RuntimeError :
+            pass
+
+    def merge (self, changes) :
+        for change in changes :
+            self.pending[change['id']] = change
+
+        self.ready.set()
+
+    async def next_batch (self, coalesce_seconds, keepalive_seconds) :
+        # None when nothing changed for keepalive_seconds
+        try :
+            await asyncio.wait_for(self.ready.wait(), keepalive_seconds)
+        except asyncio.TimeoutError :
+            return None
+
+        await asyncio.sleep(coalesce_seconds)
+        changes, self.pending = list(self.pending.values()), {}
+        self.ready.clear()
+        return changes
+
+    def close (self) :
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker :
+    # fans changes out to clients connected to this process, enough for a single asgi worker
+
+    def __init__ (self) :
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe (self, household_id) :
+        subscription = Subscription(self, household_id)
+
+        with self.lock :
+            self.subscriptions.setdefault(household_id, set()).add(subscription)
+
+        return subscription
+
+    def unsubscribe (self, subscription) :
+        with self.lock :
+            household = self.subscriptions.get(subscription.household_id, set())
+            household.discard(subscription)
+
+            if not household :
+                self.subscriptions.pop(subscription.household_id, None)
+
+    def deliver (self, household_id, changes) :
+        with self.lock :
+            subscriptions = list(self.subscriptions.get(household_id, ()))
+
+        for subscription in subscriptions :
+            subscription.deliver(changes)
+
+    def publish (self, household_id, changes) :
+        self.deliver(household_id, changes)
+
+    def stats (self) :
+        with self.lock :
+            return { 'households': len(self.subscriptions), 'clients': sum(map(len, self.subscriptions.values())) }
+
+
+class PostgresBroker (InProcessBroker) :
+    # LISTEN/NOTIFY on each shard, so every asgi worker sees writes made by any process.
+    # one listening connection per shard per process, opened by the first client to connect
+
+    def __init__ (self) :
+        super().__init__()
+        self.listeners = {}
+
+    def subscribe (self, household_id) :
+        with self.lock :
+            for alias in shards() :
+                if alias not in self.listeners or not self.listeners[alias].is_alive() :
+                    self.listeners[alias] = threading.Thread(target = self.listen, args = (alias,), name = f'live-{alias}', daemon = True)
+                    self.listeners[alias].start()
+
+        return super().subscribe(household_id)
+
+    def listen (self, alias) :
+        import psycopg
+
+        # django's cursor factory and adapters are for its own connections
+        params = connections[alias].get_connection_params()
+        params.pop('cursor_factory', None)
+        params.pop('context', None)
+
+        while True :
+            try :
+                with psycopg.connect(**params, autocommit = True) as connection :
+                    connection.execute(f'LISTEN {NOTIFY_CHANNEL}')
+
+                    for notify in connection.notifies() :
+                        message = json.loads(notify.payload)
+                        self.deliver(message['household'], message['changes'])
+
+            except psycopg.Error :
+                logger.exception('live update listener on %s lost its connection', alias)
+                time.sleep(LISTEN_RETRY_SECONDS)
+
+    def publish (self, household_id, changes) :
+        # sent on the writer's own connection, after its transaction has committed
+        from .models import Item
+
+        payloads, batch = [], []
+
+        for change in changes :
+            batch.append(change)
+
+            if len(json.dumps({ 'household': household_id, 'changes': batch }, cls = DjangoJSONEncoder)) > NOTIFY_PAYLOAD_LIMIT and len(batch) > 1 :
+                payloads.append(batch[:-1])
+                batch = batch[-1:]
+
+        payloads.append(batch)
+
+        with connections[router.db_for_write(Item)].cursor() as cursor :
+            for batch in payloads :
+                cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, json.dumps({ 'household': household_id, 'changes': batch }, cls = DjangoJSONEncoder)])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker () :
+    global _broker
+
+    if _broker is None :
+        with _broker_lock :
+            if _broker is None :
+                _broker = import_string(getattr(settings, 'LIVE_UPDATES_BROKER', 'main_app.live.InProcessBroker'))()
+
+    return _broker
+
+def publish_item_changes (household_id, changes) :
+    # nothing is pushed for a write that rolls back
+    if not household_id or not changes :
+        return
+
+    from .models import Item
+
+    # a round trip through json, so every broker hands clients the same plain values
+    changes = json.loads(json.dumps(changes, cls = DjangoJSONEncoder))
+    transaction.on_commit(lambda : get_broker().publish(household_id, changes), using = router.db_for_write(Item))
+
+def publish_items (items, deleted = False) :
+    households = {}
+
+    for item in items :
+        if item.id :
+            households.setdefault(item.household_id, []).append(item_change(item, deleted))
+
+    for household_id, changes in households.items() :
+        publish_item_changes(household_id, changes)
+
+def household_for_session (session_key) :
+    # sessions live in the cache, a database is only touched if the cache lost this one
+    try :
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        return session.get('household')
+    finally :
+        close_old_connections()
+
+def allowed_origin (origin) :
+    # a browser sends the session cookie with a websocket opened from any site, and the handshake
+    # is not checked for csrf, so only pages served from an allowed host or a trusted origin may open one
+    if not origin :
+        return False
+
+    parsed = urlsplit(origin)
+
+    for trusted in getattr(settings, 'CSRF_TRUSTED_ORIGINS', []) :
+        trusted = urlsplit(trusted)
+
+        # a leading * in a trusted origin matches its subdomains, as it does for the csrf check
+        if parsed.scheme == trusted.scheme and is_same_domain(parsed.netloc, trusted.netloc.lstrip('*')) :
+            return True
+
+    host, _ = split_domain_port(parsed.netloc)
+    return bool(host) and validate_host(host, settings.ALLOWED_HOSTS)
+
+async def wait_for_disconnect (receive, disconnect) :
+    while (await receive())['type'] != disconnect :
+        pass
+
+
+class LiveUpdates :
+    # asgi app in front of django. django 4.2 neither serves websockets nor notices a streaming
+    # client leave, so the push channel is answered here and everything else passes through
+
+    def __init__ (self, application, path = None) :
+        self.application = application
+        self.path = path or getattr(settings, 'LIVE_UPDATES_PATH', '/live')
+        self.coalesce_seconds = getattr(settings, 'LIVE_UPDATES_COALESCE_SECONDS', 0.25)
+        self.keepalive_seconds = getattr(settings, 'LIVE_UPDATES_KEEPALIVE_SECONDS', 15)
+
+    async def __call__ (self, scope, receive, send) :
+        if scope['type'] in ('http', 'websocket') and scope['path'] == self.path :
+            return await self.serve(scope, receive, send)
+
+        return await self.application(scope, receive, send)
+
+    def origin (self, scope) :
+        return dict(scope['headers']).get(b'origin', b'').decode('latin1')
+
+    async def authenticate (self, scope) :
+        cookies = parse_cookie(dict(scope['headers']).get(b'cookie', b'').decode('latin1'))
+        session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+        return await sync_to_async(household_for_session, thread_sensitive = False)(session_key) if session_key else None
+
+    def store_filter (self, scope) :
+        # ?store=<id> limits the stream to the store page that is open
+        query = dict(pair.split('=', 1) for pair in scope.get('query_string', b'').decode('latin1').split('&') if '=' in pair)
+        return int(query['store']) if query.get('store', '').isdigit() else None
+
+    async def serve (self, scope, receive, send) :
+        household_id = await self.authenticate(scope)
+        store_id = self.store_filter(scope)
+
+        if scope['type'] == 'websocket' :
+            if (await receive())['type'] != 'websocket.connect' :
+                return
+
+            if not allowed_origin(self.origin(scope)) :
+                return await send({ 'type': 'websocket.close', 'code': 4403 })
+
+            if household_id is None :
+                return await send({ 'type': 'websocket.close', 'code': 4401 })
+
+            await send({ 'type': 'websocket.accept' })
+
+            async def emit (changes) :
+                if changes is not None :
+                    await send({ 'type': 'websocket.send', 'text': json.dumps({ 'changes': changes }) })
+
+            return await self.pump(household_id, store_id, receive, 'websocket.disconnect', emit)
+
+        if household_id is None :
+            await send({ 'type': 'http.response.start', 'status': 401, 'headers': [(b'content-type', b'application/json')] })
+            return await send({ 'type': 'http.response.body', 'body': b'{"error": "Household not found"}' })
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # nginx would otherwise hold events back in its buffer
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({ 'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True })
+
+        async def emit (changes) :
+            # a comment line keeps proxies from closing an idle stream
+            body = ': keepalive\n\n' if changes is None else f'event: items\ndata: {json.dumps(changes)}\n\n'
+            await send({ 'type': 'http.response.body', 'body': body.encode(), 'more_body': True })
+
+        await self.pump(household_id, store_id, receive, 'http.disconnect', emit)
+
+    async def pump (self, household_id, store_id, receive, disconnect, emit) :
+        subscription = get_broker().subscribe(household_id)
+        gone = asyncio.ensure_future(wait_for_disconnect(receive, disconnect))
+
+        try :
+            while True :
+                batch = asyncio.ensure_future(subscription.next_batch(self.coalesce_seconds, self.keepalive_seconds))
+                await asyncio.wait({ batch, gone }, return_when = asyncio.FIRST_COMPLETED)
+
+                if gone.done() :
+                    batch.cancel()
+                    return
+
+                changes = batch.result()
+
+                if changes is not None and store_id is not None :
+                    changes = [change for change in changes if change['store_id'] == store_id]
+
+                    if not changes :
+                        continue
+
+                try :
+                    await emit(changes)
+                except OSError :
+                    return
+
+        finally :
+            gone.cancel()
+            subscription.close()
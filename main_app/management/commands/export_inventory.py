@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.exports import export_inventory, EXPORT_FORMATS, EXPORT_CHUNK_SIZE
+from main_app.models import Household
+from main_app.routers import database_route
+
+
+class Command (BaseCommand) :
+    help = 'Stream a household inventory as CSV or NDJSON'
+
+    def add_arguments (self, parser) :
+        parser.add_argument('household_id', type = int)
+        parser.add_argument('--format', choices = list(EXPORT_FORMATS), default = 'csv')
+        parser.add_argument('--output', help = 'file to write, defaults to stdout')
+        parser.add_argument('--chunk-size', type = int, default = EXPORT_CHUNK_SIZE)
+
+    def handle (self, *args, **options) :
+        with database_route(household_id = options['household_id']) :
+            self.export(options)
+
+    def export (self, options) :
+        if not Household.objects.filter(id = options['household_id']).exists() :
+            raise CommandError(f'Household {options["household_id"]} does not exist')
+
+        lines, content_type = export_inventory(options['household_id'], options['format'], options['chunk_size'])
+
+        if options['output'] :
+            with open(options['output'], 'w', newline = '') as output :
+                output.writelines(lines)
+        else :
+            sys.stdout.writelines(lines)
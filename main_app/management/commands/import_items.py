@@ -0,0 +1,38 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.imports import import_items, IMPORT_BATCH_SIZE
+from main_app.models import Store
+
+
+class Command (BaseCommand) :
+    help = 'Import items into a store from a CSV or JSON file'
+
+    def add_arguments (self, parser) :
+        parser.add_argument('store_id', type = int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices = ['csv', 'json'], help = 'defaults to the file extension')
+        parser.add_argument('--batch-size', type = int, default = IMPORT_BATCH_SIZE)
+
+    def handle (self, *args, **options) :
+        try :
+            store = Store.objects.get(id = options['store_id'])
+        except Store.DoesNotExist :
+            raise CommandError(f'Store {options["store_id"]} does not exist')
+
+        path = Path(options['path'])
+        format = options['format'] or path.suffix.lstrip('.').lower()
+
+        if format in ('ndjson', 'jsonl') :
+            format = 'json'
+
+        if format not in ('csv', 'json') :
+            raise CommandError('Could not tell the file format, pass --format')
+
+        with path.open('rb') as stream :
+            report = import_items(store, stream, format, batch_size = options['batch_size'])
+
+        self.stdout.write(json.dumps(report.as_dict(), indent = 2))
+        self.stdout.write(self.style.SUCCESS(f'Imported {report.created} items, {report.failed} rows failed'))
@@ -0,0 +1,46 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.synthetic import (
+    SyntheticDataset, next_synthetic_number, SYNTHETIC_CHUNK_SIZE, SYNTHETIC_CITY, SYNTHETIC_PASSCODE, SYNTHETIC_PASSWORD,
+)
+
+
+class Command (BaseCommand) :
+    help = 'Generate households, members, stores and items for capacity tests across the shards, loaded with COPY on Postgres'
+
+    def add_arguments (self, parser) :
+        parser.add_argument('--households', type = int, required = True)
+        parser.add_argument('--members', type = int, default = 2, help = 'members per household')
+        parser.add_argument('--stores', type = int, default = 3, help = 'stores per household')
+        parser.add_argument('--items', type = int, default = 100, help = 'items per store')
+        parser.add_argument('--chunk-size', type = int, default = SYNTHETIC_CHUNK_SIZE, help = 'households per transaction')
+        parser.add_argument('--seed', type = int, help = 'random seed for reproducible item data')
+        parser.add_argument('--defer-indexes', action = 'store_true', help = 'drop the item indexes during the load and rebuild them after, only on an idle database')
+
+    def handle (self, *args, **options) :
+        if min(options['households'], options['chunk_size']) < 1 :
+            raise CommandError('--households and --chunk-size must be positive')
+
+        if min(options['members'], options['stores'], options['items']) < 0 :
+            raise CommandError('--members, --stores and --items cannot be negative')
+
+        dataset = SyntheticDataset(
+            options['households'], options['members'], options['stores'], options['items'],
+            seed = options['seed'], start = next_synthetic_number(),
+        )
+        started = time.monotonic()
+
+        def progress (households, members, stores, items) :
+            elapsed = time.monotonic() - started
+            self.stderr.write(f'{households} households, {items} items, {items / elapsed if elapsed else 0:.0f} items/s')
+
+        totals = dataset.load(chunk_size = options['chunk_size'], progress = progress, defer_indexes = options['defer_indexes'])
+        totals['seconds'] = round(time.monotonic() - started, 2)
+
+        self.stdout.write(json.dumps(totals, indent = 2))
+        self.stdout.write(self.style.SUCCESS(
+            f'Households are in city "{SYNTHETIC_CITY}", passcode "{SYNTHETIC_PASSCODE}", member password "{SYNTHETIC_PASSWORD}"'
+        ))
@@ -0,0 +1,47 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from main_app.digests import run_digest, reset_digest, DIGEST_BATCH_SIZE, DIGEST_SETTLE_SECONDS
+from main_app.routers import database_route, shards
+
+
+class Command (BaseCommand) :
+    help = 'Write a digest of items at or below minimum stock per household, once or as a worker'
+
+    def add_arguments (self, parser) :
+        parser.add_argument('--loop', action = 'store_true', help = 'keep running, one pass every --interval seconds')
+        parser.add_argument('--interval', type = float, default = 300)
+        parser.add_argument('--batch-size', type = int, default = DIGEST_BATCH_SIZE, help = 'households per batch')
+        parser.add_argument('--settle-seconds', type = float, default = DIGEST_SETTLE_SECONDS)
+        parser.add_argument('--full', action = 'store_true', help = 'forget the checkpoint and report every low item again')
+
+    def handle (self, *args, **options) :
+        if options['batch_size'] < 1 :
+            raise CommandError('--batch-size must be positive')
+
+        if options['full'] :
+            for alias in shards() :
+                with database_route(alias = alias) :
+                    reset_digest()
+
+        while True :
+            # each shard keeps its own checkpoint and digests
+            for alias in shards() :
+                with database_route(alias = alias) :
+                    report = run_digest(options['batch_size'], options['settle_seconds'])
+
+                self.stdout.write(json.dumps({ 'database': alias, **report }, default = str))
+
+            if not options['loop'] :
+                return
+
+            # a long lived worker must not hold on to a connection the database has dropped
+            close_old_connections()
+
+            try :
+                time.sleep(options['interval'])
+            except KeyboardInterrupt :
+                return
@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.routers import shards
+from main_app.sync import prune_tombstones, TOMBSTONE_PRUNE_BATCH_SIZE
+
+
+class Command (BaseCommand) :
+    help = 'Delete tombstones of deleted stores and items that no sync token can still reach'
+
+    def add_arguments (self, parser) :
+        parser.add_argument('--batch-size', type = int, default = TOMBSTONE_PRUNE_BATCH_SIZE)
+
+    def handle (self, *args, **options) :
+        if options['batch_size'] < 1 :
+            raise CommandError('--batch-size must be positive')
+
+        # each shard holds the tombstones of its own households
+        for alias in shards() :
+            removed = prune_tombstones(alias, batch_size = options['batch_size'])
+            self.stdout.write(json.dumps({ 'database': alias, 'removed': removed }))
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, Http404
+
+from .hashers import pool as hasher_pool
+from .live import get_broker
+from .sessions import writer as session_writer
+
+# stats that go up and down, every other stats() value only ever goes up and is a counter
+GAUGES = {
+    'pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_waiting',
+    'workers', 'queue_depth', 'in_flight', 'max_queue_depth', 'pending', 'households', 'clients',
+}
+
+def add_samples (families, prefix, help, stats, labels = None) :
+    # one family per metric name, so each gets a single HELP and TYPE however many aliases report it
+    for key, value in stats.items() :
+        kind = 'gauge' if key in GAUGES else 'counter'
+        name = f'{prefix}_{key}' if kind == 'gauge' else f'{prefix}_{key}_total'
+        family = families.setdefault(name, (f'{help}, {key}', kind, []))
+        family[2].append((labels or {}, value))
+
+def metric_lines (name, help, kind, samples) :
+    # samples are (labels, value) pairs in prometheus text format
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+
+    for labels, value in samples :
+        label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+    return lines
+
+def collect () :
+    families = {}
+
+    for alias in connections :
+        connection = connections[alias]
+        connect_stats = getattr(connection, 'connect_stats', {}).get(alias, {})
+        pool_stats = connection.pool_stats() if hasattr(connection, 'pool_stats') else {}
+
+        add_samples(families, 'grocery_db', 'Django connect() calls', connect_stats, { 'alias': alias })
+        add_samples(families, 'grocery_db_pool', 'psycopg_pool', pool_stats, { 'alias': alias })
+
+    add_samples(families, 'grocery_hasher_pool', 'password hasher pool', hasher_pool.stats())
+    add_samples(families, 'grocery_session_writer', 'session write behind', session_writer.stats())
+    add_samples(families, 'grocery_live', 'live update subscribers', get_broker().stats())
+
+    lines = []
+
+    for name, (help, kind, samples) in families.items() :
+        lines += metric_lines(name, help, kind, samples)
+
+    return '\n'.join(lines) + '\n'
+
+def metrics (request) :
+    if not settings.DEBUG and request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS :
+        raise Http404()
+
+    return HttpResponse(collect(), content_type = 'text/plain; version=0.0.4')
@@ -0,0 +1,147 @@
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+
+from .models import Household, Member
+
+# per-process household cache, only used when HOUSEHOLD_CACHE_TTL is set. entries are field values,
+# every request gets its own Household built from them rather than one instance shared by all
+_households = {}
+_households_lock = threading.Lock()
+
+def household_fields () :
+    return [field.attname for field in Household._meta.concrete_fields]
+
+def remembered_household (household_id) :
+    if getattr(settings, 'HOUSEHOLD_CACHE_TTL', 0) :
+        with _households_lock :
+            entry = _households.get(household_id)
+
+        if entry and entry[0] > time.monotonic() :
+            return Household.from_db(entry[1], household_fields(), entry[2])
+
+    return None
+
+def remember_household (household_id, household) :
+    ttl = getattr(settings, 'HOUSEHOLD_CACHE_TTL', 0)
+
+    if ttl and household :
+        values = tuple(getattr(household, name) for name in household_fields())
+
+        with _households_lock :
+            _households[household_id] = (time.monotonic() + ttl, household._state.db, values)
+
+    return household
+
+def cached_household (household_id) :
+    household = remembered_household(household_id)
+
+    if household is None :
+        household = remember_household(household_id, Household.objects.filter(id = household_id).first())
+
+    return household
+
+async def acached_household (household_id) :
+    household = remembered_household(household_id)
+
+    if household is None :
+        household = remember_household(household_id, await Household.objects.filter(id = household_id).afirst())
+
+    return household
+
+def forget_household (household_id) :
+    # only this process, the others keep theirs until the ttl runs out
+    with _households_lock :
+        _households.pop(household_id, None)
+
+def get_household (request) :
+    if not hasattr(request, '_cached_household') :
+        household_id = request.session.get('household')
+        request._cached_household = cached_household(household_id) if household_id else None
+
+    return request._cached_household
+
+def get_member (request) :
+    if not hasattr(request, '_cached_member') :
+        member_id = request.session.get('member')
+        household = get_household(request)
+        request._cached_member = None
+
+        if member_id and household :
+            request._cached_member = Member.objects.filter(id = member_id, household = household).first()
+
+    return request._cached_member
+
+async def asession (request) :
+    # session backends are sync in this django, load it once off the event loop
+    if not hasattr(request.session, '_session_cache') :
+        await sync_to_async(request.session.get)('household')
+
+    return request.session
+
+async def aget_household (request) :
+    # same memo as get_household, so request.household is free afterwards
+    if not hasattr(request, '_cached_household') :
+        household_id = (await asession(request)).get('household')
+        request._cached_household = await acached_household(household_id) if household_id else None
+
+    return request._cached_household
+
+
+class HouseholdMiddleware :
+    # resolves request.household and request.member at most once, and only if a view asks
+    sync_capable = True
+    async_capable = True
+
+    def __init__ (self, get_response) :
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response) :
+            markcoroutinefunction(self)
+
+    def __call__ (self, request) :
+        request.household = SimpleLazyObject(lambda : get_household(request))
+        request.member = SimpleLazyObject(lambda : get_member(request))
+
+        if iscoroutinefunction(self) :
+            return self.__acall__(request)
+
+        return self.get_response(request)
+
+    async def __acall__ (self, request) :
+        # asgi requests route to the async read views when an async urlconf is configured
+        if getattr(settings, 'ASYNC_ROOT_URLCONF', None) :
+            request.urlconf = settings.ASYNC_ROOT_URLCONF
+
+        return await self.get_response(request)
+
+
+def household_missing (request) :
+    if request.session.pop('household', None) is None :
+        messages.error(request, 'Household not found. Please try again')
+
+    request.session.pop('member', None)
+    return redirect('household_select')
+
+
+class HouseholdRequiredMixin :
+    # single place for the missing or deleted household redirect
+
+    def dispatch (self, request, *args, **kwargs) :
+        if get_household(request) is None :
+            return household_missing(request)
+
+        return super().dispatch(request, *args, **kwargs)
+
+
+class AsyncHouseholdRequiredMixin :
+    async def dispatch (self, request, *args, **kwargs) :
+        if await aget_household(request) is None :
+            return household_missing(request)
+
+        return await super().dispatch(request, *args, **kwargs)
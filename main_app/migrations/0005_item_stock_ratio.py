@@ -0,0 +1,93 @@
+# Generated by Django 4.2 on 2026-10-18 18:19
+
+from django.db import migrations, models
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, NullIf
+
+BACKFILL_BATCH_SIZE = 5000
+
+INDEX = models.Index(
+    fields=["store", "stock_ratio", "id"], name="item_store_stock_ratio_idx"
+)
+
+
+def backfill_stock_ratio(apps, schema_editor):
+    # small keyset batches, each committed on its own, so no long row locks
+    Item = apps.get_model("main_app", "Item")
+    ratio = Cast("current_stock", FloatField()) / NullIf("minimum_stock", Value(0))
+    last_id = 0
+
+    while True:
+        ids = list(
+            Item.objects.using(schema_editor.connection.alias)
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:BACKFILL_BATCH_SIZE]
+        )
+
+        if not ids:
+            break
+
+        Item.objects.using(schema_editor.connection.alias).filter(
+            id__gte=ids[0], id__lte=ids[-1]
+        ).update(stock_ratio=ratio)
+        last_id = ids[-1]
+
+
+def create_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        # build without blocking writes on large tables
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s (%s)"
+            % (
+                schema_editor.quote_name(INDEX.name),
+                schema_editor.quote_name(Item._meta.db_table),
+                ", ".join(
+                    schema_editor.quote_name(column)
+                    for column in ["store_id", "stock_ratio", "id"]
+                ),
+            )
+        )
+    else:
+        schema_editor.add_index(Item, INDEX)
+
+
+def drop_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "DROP INDEX CONCURRENTLY IF EXISTS %s"
+            % schema_editor.quote_name(INDEX.name)
+        )
+    else:
+        schema_editor.remove_index(Item, INDEX)
+
+
+class Migration(migrations.Migration):
+    # backfill batches and CREATE INDEX CONCURRENTLY must run outside a transaction
+    atomic = False
+
+    dependencies = [
+        ("main_app", "0004_alter_item_average_usage_alter_item_current_stock_and_more"),
+    ]
+
+    operations = [
+        # nullable column, so postgres adds it without rewriting the table
+        migrations.AddField(
+            model_name="item",
+            name="stock_ratio",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_stock_ratio, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="item", index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_index, drop_index),
+            ],
+        ),
+    ]
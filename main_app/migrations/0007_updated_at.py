@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0006_stock_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="store",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="store",
+            index=models.Index(
+                fields=["household", "updated_at"], name="store_household_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["store", "updated_at"], name="item_store_updated_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 18:50
+
+from django.db import migrations
+
+# gin_trgm_ops indexes only exist on postgres, sqlite runs use main_app.search's in-memory index
+INDEXES = {
+    "item_name_trgm_idx": "name",
+    "item_description_trgm_idx": "description",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for name, column in INDEXES.items():
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON main_app_item USING gin (%s gin_trgm_ops)"
+            % (schema_editor.quote_name(name), schema_editor.quote_name(column))
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name in INDEXES:
+        schema_editor.execute(
+            "DROP INDEX CONCURRENTLY IF EXISTS %s" % schema_editor.quote_name(name)
+        )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("main_app", "0007_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
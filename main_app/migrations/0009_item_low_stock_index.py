@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+INDEX = models.Index(
+    condition=models.Q(("current_stock__lt", models.F("minimum_stock"))),
+    fields=["store"],
+    name="item_store_low_stock_idx",
+)
+
+
+def create_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        # build without blocking writes on large tables
+        schema_editor.execute(INDEX.create_sql(Item, schema_editor, concurrently=True))
+    else:
+        schema_editor.add_index(Item, INDEX)
+
+
+def drop_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(INDEX.remove_sql(Item, schema_editor, concurrently=True))
+    else:
+        schema_editor.remove_index(Item, INDEX)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("main_app", "0008_item_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="item", index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_index, drop_index),
+            ],
+        ),
+    ]
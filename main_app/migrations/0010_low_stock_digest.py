@@ -0,0 +1,110 @@
+# Generated by Django 4.2 on 2026-10-18 18:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+INDEX = models.Index(
+    condition=models.Q(("current_stock__lte", models.F("minimum_stock"))),
+    fields=["updated_at", "id"],
+    name="item_restock_updated_idx",
+)
+
+
+def create_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        # build without blocking writes on large tables
+        schema_editor.execute(INDEX.create_sql(Item, schema_editor, concurrently=True))
+    else:
+        schema_editor.add_index(Item, INDEX)
+
+
+def drop_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(INDEX.remove_sql(Item, schema_editor, concurrently=True))
+    else:
+        schema_editor.remove_index(Item, INDEX)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("main_app", "0009_item_low_stock_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("position", models.DateTimeField(blank=True, null=True)),
+                ("pending_position", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LowStockDigest",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("window_start", models.DateTimeField(blank=True, null=True)),
+                ("window_end", models.DateTimeField()),
+                ("items", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="item", index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_index, drop_index),
+            ],
+        ),
+        migrations.AddField(
+            model_name="lowstockdigest",
+            name="household",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="low_stock_digests",
+                to="main_app.household",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lowstockdigest",
+            index=models.Index(
+                condition=models.Q(("sent_at__isnull", True)),
+                fields=["id"],
+                name="digest_unsent_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="lowstockdigest",
+            constraint=models.UniqueConstraint(
+                fields=("household", "window_end"),
+                name="unique_digest_per_household_window",
+            ),
+        ),
+    ]
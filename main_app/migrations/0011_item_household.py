@@ -0,0 +1,91 @@
+# Generated by Django 4.2 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+BACKFILL_BATCH_SIZE = 5000
+
+INDEX = models.Index(
+    fields=["household", "name", "price", "id"], name="item_household_name_price_idx"
+)
+
+
+def backfill_household(apps, schema_editor):
+    # small keyset batches, each committed on its own, so no long row locks
+    Item = apps.get_model("main_app", "Item")
+    Store = apps.get_model("main_app", "Store")
+    household = Subquery(
+        Store.objects.filter(id=OuterRef("store_id")).values("household_id")[:1]
+    )
+    last_id = 0
+
+    while True:
+        ids = list(
+            Item.objects.using(schema_editor.connection.alias)
+            .filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:BACKFILL_BATCH_SIZE]
+        )
+
+        if not ids:
+            break
+
+        Item.objects.using(schema_editor.connection.alias).filter(
+            id__gte=ids[0], id__lte=ids[-1]
+        ).update(household=household)
+        last_id = ids[-1]
+
+
+def create_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        # build without blocking writes on large tables
+        schema_editor.execute(INDEX.create_sql(Item, schema_editor, concurrently=True))
+    else:
+        schema_editor.add_index(Item, INDEX)
+
+
+def drop_index(apps, schema_editor):
+    Item = apps.get_model("main_app", "Item")
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(INDEX.remove_sql(Item, schema_editor, concurrently=True))
+    else:
+        schema_editor.remove_index(Item, INDEX)
+
+
+class Migration(migrations.Migration):
+    # backfill batches and CREATE INDEX CONCURRENTLY must run outside a transaction
+    atomic = False
+
+    dependencies = [
+        ("main_app", "0010_low_stock_digest"),
+    ]
+
+    operations = [
+        # nullable column, so postgres adds it without rewriting the table
+        migrations.AddField(
+            model_name="item",
+            name="household",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="items",
+                to="main_app.household",
+            ),
+        ),
+        migrations.RunPython(backfill_household, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="item", index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_index, drop_index),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0011_item_household"),
+    ]
+
+    operations = [
+        # a constant default and no check constraint, so postgres adds the column without
+        # rewriting or scanning the table
+        migrations.AddField(
+            model_name="item",
+            name="version",
+            field=models.IntegerField(default=1, editable=False),
+        ),
+    ]
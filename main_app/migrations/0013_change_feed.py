@@ -0,0 +1,111 @@
+# Generated by Django 4.2 on 2026-10-18 19:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+import main_app.models
+
+INDEXES = {
+    "item": models.Index(
+        fields=["household", "change_seq", "id"], name="item_household_change_idx"
+    ),
+    "store": models.Index(
+        fields=["household", "change_seq"], name="store_household_change_idx"
+    ),
+}
+
+
+def create_indexes(apps, schema_editor):
+    for model_name, index in INDEXES.items():
+        model = apps.get_model("main_app", model_name)
+
+        if schema_editor.connection.vendor == "postgresql":
+            # build without blocking writes on large tables
+            schema_editor.execute(index.create_sql(model, schema_editor, concurrently=True))
+        else:
+            schema_editor.add_index(model, index)
+
+
+def drop_indexes(apps, schema_editor):
+    for model_name, index in INDEXES.items():
+        model = apps.get_model("main_app", model_name)
+
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute(index.remove_sql(model, schema_editor, concurrently=True))
+        else:
+            schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY must run outside a transaction
+    atomic = False
+
+    dependencies = [
+        ("main_app", "0012_item_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("store", "Store"), ("item", "Item")], max_length=5
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                (
+                    "change_seq",
+                    main_app.models.ChangeSeqField(default=0, editable=False),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "household",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tombstones",
+                        to="main_app.household",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["household", "change_seq"],
+                        name="tombstone_household_change_idx",
+                    )
+                ],
+            },
+        ),
+        # existing rows read as 0, older than any sync token, so they need no backfill and
+        # postgres adds the columns without rewriting the tables
+        migrations.AddField(
+            model_name="item",
+            name="change_seq",
+            field=main_app.models.ChangeSeqField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="store",
+            name="change_seq",
+            field=main_app.models.ChangeSeqField(default=0, editable=False),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index)
+                for model_name, index in INDEXES.items()
+            ],
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+        ),
+    ]
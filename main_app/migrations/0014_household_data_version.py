@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("main_app", "0013_change_feed"),
+    ]
+
+    operations = [
+        # a constant default, so postgres adds the column without rewriting the table
+        migrations.AddField(
+            model_name="household",
+            name="data_version",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 19:40
+
+from django.db import migrations
+
+# every search is within one household, so the household id leads each trigram index and a
+# search only reads that household's matches. btree_gin lets the integer column sit in a gin index
+INDEXES = {
+    "item_household_name_trgm_idx": ("item_name_trgm_idx", "name"),
+    "item_household_description_trgm_idx": ("item_description_trgm_idx", "description"),
+}
+
+
+def create_index(schema_editor, name, columns):
+    schema_editor.execute(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON main_app_item USING gin (%s)"
+        % (schema_editor.quote_name(name), columns)
+    )
+
+
+def drop_index(schema_editor, name):
+    schema_editor.execute(
+        "DROP INDEX CONCURRENTLY IF EXISTS %s" % schema_editor.quote_name(name)
+    )
+
+
+def create_household_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+
+    for name, (old_name, column) in INDEXES.items():
+        create_index(
+            schema_editor,
+            name,
+            "household_id, %s gin_trgm_ops" % schema_editor.quote_name(column),
+        )
+        drop_index(schema_editor, old_name)
+
+
+def drop_household_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, (old_name, column) in INDEXES.items():
+        create_index(
+            schema_editor, old_name, "%s gin_trgm_ops" % schema_editor.quote_name(column)
+        )
+        drop_index(schema_editor, name)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("main_app", "0014_household_data_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_household_trigram_indexes, drop_household_trigram_indexes
+        ),
+    ]
@@ -1,17 +1,76 @@
 from django.db import models
+from decimal import Decimal
+
+from django.db.models import F, Q, Func, Value, Case, When, Count, Sum, Subquery, OuterRef, BigIntegerField, FloatField, DecimalField, ExpressionWrapper
+from django.db.models.expressions import Combinable
+from django.db.models.functions import Cast, NullIf, Coalesce
 from django.urls import reverse
+from django.utils import timezone
 
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.auth.hashers import make_password
+
+from .cache import bump_household_versions
+from .hashers import verify_secret, hash_secret
+from .live import LIVE_FIELDS, publish_items
+from .routers import shards, shard_for, reserve_household_id
+
+class HashedSecretMixin :
+    # fields holding make_password hashes, hashed only when given a new raw value
+    secret_fields = []
+
+    @classmethod
+    def from_db (cls, db, field_names, values) :
+        instance = super().from_db(db, field_names, values)
+        instance.remember_secrets()
+        return instance
+
+    def refresh_from_db (self, using = None, fields = None, **kwargs) :
+        super().refresh_from_db(using, fields, **kwargs)
+        self.remember_secrets(self.secret_fields if fields is None else fields)
+
+    def remember_secrets (self, fields = None) :
+        stored = self.__dict__.setdefault('_stored_secrets', {})
+
+        for field in self.secret_fields :
+            if fields is None or field in fields :
+                stored[field] = self.__dict__.get(field)
+
+    def hash_changed_secrets (self) :
+        stored = self.__dict__.get('_stored_secrets', {})
+
+        for field in self.secret_fields :
+            # deferred and never loaded, so it cannot have changed
+            if field not in self.__dict__ :
+                continue
+
+            if self.__dict__[field] != stored.get(field) :
+                setattr(self, field, make_password(self.__dict__[field].strip()))
 
-class Household (models.Model) :
+    def verify_secret (self, field, raw_secret) :
+        valid, needs_rehash = verify_secret(raw_secret, getattr(self, field))
+
+        # hasher settings changed since this was stored, upgrade it while we know the raw value
+        if valid and needs_rehash :
+            setattr(self, field, hash_secret(raw_secret))
+            self.remember_secrets([field])
+            self.save(update_fields = [field])
+
+        return valid
+
+
+class Household (HashedSecretMixin, models.Model) :
     street_address = models.CharField(max_length = 100, null = False, blank = False)
     city = models.CharField(max_length = 100, null = False, blank = False)
     state = models.CharField(max_length = 2, null = False, blank = False)
     zip_code =  models.CharField(max_length = 5, null = False, blank = False)
     passcode = models.CharField(max_length = 128, null = False, blank = False)
     created_at = models.DateTimeField(auto_now_add = True)
+    # moves on every committed write to the household's stores and items, cached views key on it
+    data_version = models.BigIntegerField(default = 0, editable = False)
+
+    secret_fields = ['passcode']
 
     class Meta :
         # unique address constraint
@@ -22,18 +81,35 @@ class Household (models.Model) :
             )
         ]
 
-    def save (self, *args, **kwargs) :
+    def normalize (self) :
         for field in ['street_address', 'city', 'state'] :
             value = getattr(self, field)
             setattr(self, field, value.strip().lower())
 
         self.zip_code = self.zip_code.strip()
 
-        self.passcode = make_password(self.passcode.strip())
+    def address (self) :
+        return { field: getattr(self, field) for field in ['street_address', 'city', 'state', 'zip_code'] }
+
+    def save (self, *args, **kwargs) :
+        self.normalize()
+
+        # with more than one shard the id is taken first, it picks the shard the row is written to,
+        # even for a manager create() that would otherwise pass the queryset's alias
+        if self.pk is None and len(shards()) > 1 :
+            self.pk = reserve_household_id()
+            kwargs.update(force_insert = True, using = shard_for(self.pk))
+
+        # data_version only moves through bump_household_versions, a stale copy must not write it back
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert') :
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'data_version']
+
+        self.hash_changed_secrets()
         super(Household, self).save(*args, **kwargs)
+        self.remember_secrets()
 
     def verify_passcode (self, raw_passcode) :
-        return check_password(raw_passcode, self.passcode)
+        return self.verify_secret('passcode', raw_passcode)
     
     def get_absolute_url (self) :
         return reverse('member_select')
@@ -42,12 +118,14 @@ class Household (models.Model) :
         return f'{self.street_address.title()} {self.city.title()}, {self.state.upper()} {self.zip_code}'
 
 
-class Member (models.Model) :
+class Member (HashedSecretMixin, models.Model) :
     name = models.CharField(max_length = 30, null = False, blank = False)
     password = models.CharField(max_length = 128, null = False, blank = False)
     created_at = models.DateTimeField(auto_now_add = True)
     household = models.ForeignKey(Household, on_delete = models.CASCADE, related_name = 'members', null = False, blank = False)
 
+    secret_fields = ['password']
+
     class Meta :
         # unique member name within a household
         constraints = [
@@ -59,11 +137,12 @@ class Member (models.Model) :
 
     def save (self, *args, **kwargs) :
         self.name = self.name.strip().lower()
-        self.password = make_password(self.password.strip())
+        self.hash_changed_secrets()
         super(Member, self).save(*args, **kwargs)
+        self.remember_secrets()
 
     def verify_password (self, raw_password) :
-        return check_password(raw_password, self.password)
+        return self.verify_secret('password', raw_password)
     
     def get_absolute_url (self) :
         return reverse('store_list')
@@ -72,6 +151,73 @@ class Member (models.Model) :
         return f'{self.name.title()} at {self.household}'
     
 
+class ChangeStamp (Func) :
+    # a write's place in its household's change feed (see sync.py). on postgres it is the writing
+    # transaction's id, so a reader can tell which stamped writes may not have committed yet
+    output_field = BigIntegerField()
+
+    def as_sql (self, compiler, connection, **extra_context) :
+        # sqlite lets one transaction write at a time, so its clock orders the writes, in microseconds
+        return "CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER)", []
+
+    def as_postgresql (self, compiler, connection, **extra_context) :
+        return 'txid_current()', []
+
+
+class ChangeSeqField (models.BigIntegerField) :
+    # stamped by the database on every insert and save, the new value is not read back
+    def pre_save (self, model_instance, add) :
+        return ChangeStamp()
+
+
+# items that need restocking, also the condition of the item_store_low_stock_idx partial index
+LOW_STOCK = Q(current_stock__lt = F('minimum_stock'))
+# at or below minimum, what the shopping list and the low stock digest report
+NEEDS_RESTOCK = Q(current_stock__lte = F('minimum_stock'))
+# what a member edits, a write to any of these moves the item to its next version
+VERSIONED_FIELDS = ['name', 'description', 'price', 'unit', 'current_stock', 'ideal_stock', 'minimum_stock', 'store']
+
+
+class ItemConflict (Exception) :
+    # the item was written by someone else since this copy of it was read
+    pass
+
+
+def restock_cost_expression () :
+    return ExpressionWrapper(
+        F('price') * (F('ideal_stock') - F('current_stock')),
+        output_field = DecimalField(max_digits = 12, decimal_places = 2)
+    )
+
+def store_item_aggregate (aggregate, condition = None) :
+    # correlated per store, so each one is an index scan instead of a pass over every household item
+    items = Item.objects.filter(store = OuterRef('pk'))
+
+    if condition is not None :
+        items = items.filter(condition)
+
+    return Subquery(items.order_by().values('store').annotate(value = aggregate).values('value'))
+
+
+class StoreQuerySet (models.QuerySet) :
+    def update (self, **kwargs) :
+        # set based writes skip pre_save, so they stamp the change feed themselves
+        kwargs.setdefault('change_seq', ChangeStamp())
+        return super().update(**kwargs)
+
+    def with_summary (self) :
+        # item count, low stock count and restock cost per store, all in the one store query
+        return self.annotate(
+            item_count = Coalesce(store_item_aggregate(Count('id')), 0),
+            low_stock_count = Coalesce(store_item_aggregate(Count('id'), LOW_STOCK), 0),
+            restock_cost = Coalesce(
+                store_item_aggregate(Sum(restock_cost_expression()), LOW_STOCK),
+                Value(Decimal('0.00')),
+                output_field = DecimalField(max_digits = 12, decimal_places = 2)
+            ),
+        )
+
+
 class Store (models.Model) :
     name = models.CharField(max_length = 30, null = False, blank = False)
     street_address = models.CharField(max_length = 100, null = False, blank = False)
@@ -79,7 +225,12 @@ class Store (models.Model) :
     state = models.CharField(max_length = 2, null = False, blank = False)
     zip_code =  models.CharField(max_length = 5, null = False, blank = False)
     created_at = models.DateTimeField(auto_now_add = True)
+    updated_at = models.DateTimeField(auto_now = True)
     household = models.ForeignKey(Household, on_delete = models.CASCADE, related_name = 'stores', null = False, blank = False)
+    # position in the household's change feed, 0 for rows never written since the feed was added
+    change_seq = ChangeSeqField(default = 0, editable = False)
+
+    objects = StoreQuerySet.as_manager()
 
     class Meta :
         # unique store name within a household
@@ -89,6 +240,13 @@ class Store (models.Model) :
                 name = 'unique_store_name_within_household'
             )
         ]
+
+        # cheap max(updated_at) for list versions
+        indexes = [
+            models.Index(fields = ['household', 'updated_at'], name = 'store_household_updated_idx'),
+            # stores changed since a sync token
+            models.Index(fields = ['household', 'change_seq'], name = 'store_household_change_idx'),
+        ]
     
     def save (self, *args, **kwargs) :
         self.name = self.name.strip().lower()
@@ -98,6 +256,171 @@ class Store (models.Model) :
         return f'{self.name.title()} at {self.street_address.title()} {self.city.title()}, {self.state.upper()} {self.zip_code}'
     
 
+def compute_stock_ratio (current_stock, minimum_stock) :
+    # items without a minimum never need restocking, so they have no ratio
+    if not minimum_stock :
+        return None
+
+    return current_stock / minimum_stock
+
+def stock_ratio_expression (current_stock = None, minimum_stock = None) :
+    # sql twin of compute_stock_ratio, built from the *new* stock values so it
+    # can sit in the same SET clause as an F() increment
+    current_stock = F('current_stock') if current_stock is None else current_stock
+    minimum_stock = F('minimum_stock') if minimum_stock is None else minimum_stock
+
+    if not isinstance(current_stock, Combinable) :
+        current_stock = Value(current_stock)
+
+    if not isinstance(minimum_stock, Combinable) :
+        minimum_stock = Value(minimum_stock)
+
+    return Cast(current_stock, FloatField()) / NullIf(minimum_stock, Value(0))
+
+
+def fill_item_households (objs) :
+    # one store query for the whole batch, and none when the stores are already loaded
+    missing = {}
+
+    for obj in objs :
+        if Item._meta.get_field('store').is_cached(obj) :
+            obj.household_id = obj.store.household_id
+        elif obj.household_id is None :
+            missing.setdefault(obj.store_id, []).append(obj)
+
+    if missing :
+        for store_id, household_id in Store.objects.filter(id__in = missing.keys()).values_list('id', 'household_id') :
+            for obj in missing[store_id] :
+                obj.household_id = household_id
+
+def households_for_items (objs) :
+    fill_item_households([obj for obj in objs if obj.household_id is None])
+    return { obj.household_id for obj in objs }
+
+
+class ItemQuerySet (models.QuerySet) :
+    # set based writes skip post_save, so they invalidate household caches themselves
+
+    def by_restock_urgency (self) :
+        # matches item_store_stock_ratio_idx, untracked items (null ratio) go last
+        return self.order_by(F('stock_ratio').asc(nulls_last = True), 'id')
+
+    def update (self, **kwargs) :
+        # auto_now only fires in save()
+        kwargs.setdefault('updated_at', timezone.now())
+
+        if 'version' not in kwargs and set(kwargs) & set(VERSIONED_FIELDS) :
+            kwargs['version'] = F('version') + 1
+
+        kwargs.setdefault('change_seq', ChangeStamp())
+
+        if 'current_stock' in kwargs or 'minimum_stock' in kwargs :
+            kwargs['stock_ratio'] = stock_ratio_expression(
+                kwargs.get('current_stock'), kwargs.get('minimum_stock')
+            )
+
+        household_ids = list(self.values_list('store__household_id', flat = True).distinct())
+        rows = super().update(**kwargs)
+        bump_household_versions(household_ids, self.db)
+        return rows
+
+    def delete (self) :
+        # one insert of tombstones for the whole set, the per item post_delete leaves these alone
+        Tombstone.record((Tombstone.ITEM, item_id, household_id) for item_id, household_id in self.values_list('id', 'household_id'))
+        return super().delete()
+
+    def bulk_create (self, objs, *args, **kwargs) :
+        objs = list(objs)
+
+        for obj in objs :
+            obj.refresh_stock_ratio()
+
+        fill_item_households(objs)
+        created = super().bulk_create(objs, *args, **kwargs)
+        bump_household_versions(households_for_items(objs), self.db)
+        publish_items(objs)
+        return created
+
+    def bulk_update (self, objs, fields, *args, **kwargs) :
+        objs = list(objs)
+        fields = list(fields)
+
+        if 'current_stock' in fields or 'minimum_stock' in fields :
+            for obj in objs :
+                obj.refresh_stock_ratio()
+
+            if 'stock_ratio' not in fields :
+                fields.append('stock_ratio')
+
+        if 'updated_at' not in fields :
+            updated_at = timezone.now()
+
+            for obj in objs :
+                obj.updated_at = updated_at
+
+            fields.append('updated_at')
+
+        versioned = 'version' not in fields and set(fields) & set(VERSIONED_FIELDS)
+
+        if versioned :
+            for obj in objs :
+                obj.version = F('version') + 1
+
+            fields.append('version')
+
+        if 'change_seq' not in fields :
+            for obj in objs :
+                obj.change_seq = ChangeStamp()
+
+            fields.append('change_seq')
+
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+
+        # the new values are only known to the database, they are read again if asked for
+        for obj in objs :
+            for field in ['version', 'change_seq'] :
+                if isinstance(obj.__dict__.get(field), Combinable) :
+                    del obj.__dict__[field]
+
+        bump_household_versions(households_for_items(objs), self.db)
+
+        # usage bookkeeping alone changes nothing a list shows
+        if set(fields) & set(LIVE_FIELDS) - { 'updated_at' } :
+            publish_items(objs)
+
+        return rows
+
+    def compare_and_swap (self, edits, updated_at = None) :
+        # edits are {item_id: (version, {field: value})}. one UPDATE writes every item still at the
+        # version its editor read, no row is locked in between. returns the ids that were written
+        if not edits :
+            return set()
+
+        updated_at = updated_at or timezone.now()
+        current = Q()
+
+        for item_id, (version, changes) in edits.items() :
+            current |= Q(id = item_id, version = version)
+
+        values = {}
+
+        for field in { field for version, changes in edits.values() for field in changes } :
+            values[field] = Case(
+                *[When(id = item_id, then = Value(changes[field])) for item_id, (version, changes) in edits.items() if field in changes],
+                default = F(field),
+                output_field = Item._meta.get_field(field),
+            )
+
+        rows = self.filter(current).update(**values, version = F('version') + 1, updated_at = updated_at)
+
+        if rows == len(edits) :
+            return set(edits)
+
+        # a row is ours if it moved to exactly the next version at this write's timestamp
+        written = self.filter(id__in = edits, updated_at = updated_at).values_list('id', 'version')
+        return { item_id for item_id, version in written if version == edits[item_id][0] + 1 }
+
+
 class Item (models.Model) :
     name = models.CharField(max_length = 30, null = False, blank = False)
     description = models.CharField(max_length = 100, default = '', blank = True)
@@ -107,8 +430,21 @@ class Item (models.Model) :
     ideal_stock = models.IntegerField(validators = [MinValueValidator(0)], null = False, blank = False)
     minimum_stock = models.IntegerField(validators = [MinValueValidator(0)], null = False, blank = False)
     average_usage = models.IntegerField(default = 0, validators = [MinValueValidator(0)], null = False, blank = True)
+    # current_stock / minimum_stock, maintained on every write so listings can sort on an index
+    stock_ratio = models.FloatField(null = True, blank = True, editable = False)
+    # time decayed consumption rate, updated per stock event (see usage.py)
+    daily_usage = models.FloatField(default = 0, editable = False)
+    last_consumed_at = models.DateTimeField(null = True, blank = True, editable = False)
     created_at = models.DateTimeField(auto_now_add = True)
+    updated_at = models.DateTimeField(auto_now = True)
     store = models.ForeignKey(Store, on_delete = models.CASCADE, related_name = 'items', null = False, blank = False)
+    # copy of store.household_id, so household wide queries skip the store join and can use one index
+    household = models.ForeignKey(Household, on_delete = models.CASCADE, related_name = 'items', null = True, blank = True, editable = False, db_index = False)
+    # moves up by one on every write to VERSIONED_FIELDS, edits compare and swap on it
+    version = models.IntegerField(default = 1, editable = False)
+    change_seq = ChangeSeqField(default = 0, editable = False)
+
+    objects = ItemQuerySet.as_manager()
 
     class Meta :
         # minimum_stock has to be less than ideal_stock
@@ -119,15 +455,182 @@ class Item (models.Model) :
             )
         ]
 
-    def save (self, *args, **kwargs) :
-        if self.minimum_stock > self.ideal_stock :
-            raise ValidationError('Minimum stock cannot be greater than ideal stock')
-        
+        # most urgent first listing per store
+        indexes = [
+            models.Index(fields = ['store', 'stock_ratio', 'id'], name = 'item_store_stock_ratio_idx'),
+            models.Index(fields = ['store', 'updated_at'], name = 'item_store_updated_idx'),
+            # low stock counts and restock costs only ever read the few items below their minimum
+            models.Index(fields = ['store'], condition = LOW_STOCK, name = 'item_store_low_stock_idx'),
+            # the digest job's incremental scan, only items that need restocking in updated_at order
+            models.Index(fields = ['updated_at', 'id'], condition = NEEDS_RESTOCK, name = 'item_restock_updated_idx'),
+            # cheapest store per item name, read in index order with no sort
+            models.Index(fields = ['household', 'name', 'price', 'id'], name = 'item_household_name_price_idx'),
+            # items changed since a sync token, paged in feed order
+            models.Index(fields = ['household', 'change_seq', 'id'], name = 'item_household_change_idx'),
+        ]
+
+    def normalize (self) :
         self.name = self.name.strip().lower()
         self.description = self.description.strip().lower() if self.description else ''
         self.unit = self.unit.strip().lower()
 
-        super(Item, self).save(*args, **kwargs)
+    def refresh_stock_ratio (self) :
+        if isinstance(self.current_stock, Combinable) or isinstance(self.minimum_stock, Combinable) :
+            self.stock_ratio = stock_ratio_expression(self.current_stock, self.minimum_stock)
+        else :
+            self.stock_ratio = compute_stock_ratio(self.current_stock, self.minimum_stock)
+
+    def save (self, *args, **kwargs) :
+        # F() stock values are checked by the minimum_stock_le_ideal_stock constraint instead
+        comparable = not isinstance(self.minimum_stock, Combinable) and not isinstance(self.ideal_stock, Combinable)
+
+        if comparable and self.minimum_stock > self.ideal_stock :
+            raise ValidationError('Minimum stock cannot be greater than ideal stock')
+        
+        self.normalize()
+        self.refresh_stock_ratio()
+
+        if 'store' in (kwargs.get('update_fields') or ()) :
+            self.household_id = None
+
+        fill_item_households([self])
+
+        # keep the ratio and version in step when only some fields are being written
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None :
+            update_fields = set(update_fields) | { 'updated_at' }
+
+            if 'current_stock' in update_fields or 'minimum_stock' in update_fields :
+                update_fields.add('stock_ratio')
+
+            if 'store' in update_fields :
+                update_fields.add('household')
+
+            update_fields |= { 'version', 'change_seq' }
+            kwargs['update_fields'] = update_fields
+
+        if not self._state.adding :
+            self.version += 1
+
+        try :
+            super(Item, self).save(*args, **kwargs)
+        except ItemConflict :
+            self.version -= 1
+            raise
+
+    def validate_constraints (self, exclude = None) :
+        # the stock check compares two values already in hand, so it is done here instead of with the
+        # query django runs per validated item, once for every row of an import or a batch edit
+        exclude = set(exclude or ())
+        stock_fields = { 'minimum_stock', 'ideal_stock' }
+        comparable = not isinstance(self.minimum_stock, Combinable) and not isinstance(self.ideal_stock, Combinable)
+
+        if comparable and not exclude & stock_fields and self.minimum_stock > self.ideal_stock :
+            constraint = next(constraint for constraint in self._meta.constraints if constraint.name == 'minimum_stock_le_ideal_stock')
+            raise ValidationError(constraint.get_violation_error_message())
+
+        super().validate_constraints(exclude = exclude | stock_fields)
+
+    def _do_update (self, base_qs, using, pk_val, values, update_fields, forced_update) :
+        # saving an item that was read earlier is a compare and swap on the version it was read at
+        updated = super()._do_update(base_qs.filter(version = self.version - 1), using, pk_val, values, update_fields, forced_update)
+
+        if not updated and base_qs.filter(pk = pk_val).exists() :
+            raise ItemConflict(f'Item {pk_val} was changed by someone else')
+
+        return updated
+
+    def days_until_minimum (self) :
+        # projected from daily_usage, None when there is no usage to project from
+        if self.daily_usage <= 0 :
+            return None
+
+        return max(self.current_stock - self.minimum_stock, 0) / self.daily_usage
+
+    def __str__ (self) :
+        return f'{self.name} from {self.store.name}'
+
+
+class StockEvent (models.Model) :
+    RESTOCK = 'restock'
+    CONSUME = 'consume'
+    KINDS = [(RESTOCK, 'Restock'), (CONSUME, 'Consume')]
+
+    kind = models.CharField(max_length = 10, choices = KINDS, null = False, blank = False)
+    quantity = models.PositiveIntegerField(null = False, blank = False)
+    created_at = models.DateTimeField(default = timezone.now, db_index = True)
+    item = models.ForeignKey(Item, on_delete = models.CASCADE, related_name = 'stock_events', null = False, blank = False)
+
+    class Meta :
+        # append only history, read per item in time order or pruned by time
+        indexes = [
+            models.Index(fields = ['item', 'created_at'], name = 'stock_event_item_time_idx'),
+        ]
+
+    def __str__ (self) :
+        return f'{self.kind} {self.quantity} of item {self.item_id} at {self.created_at}'
+
+
+class LowStockDigest (models.Model) :
+    # outbox row, one per household per digest run, picked up and marked sent by whatever delivers it
+    household = models.ForeignKey(Household, on_delete = models.CASCADE, related_name = 'low_stock_digests', null = False, blank = False)
+    window_start = models.DateTimeField(null = True, blank = True)
+    window_end = models.DateTimeField(null = False, blank = False)
+    items = models.JSONField(default = list)
+    created_at = models.DateTimeField(auto_now_add = True)
+    sent_at = models.DateTimeField(null = True, blank = True)
+
+    class Meta :
+        # a rerun of the same window never writes a second digest
+        constraints = [
+            models.UniqueConstraint(
+                fields = ['household', 'window_end'],
+                name = 'unique_digest_per_household_window'
+            )
+        ]
+
+        # unsent digests in the order they were written
+        indexes = [
+            models.Index(fields = ['id'], condition = Q(sent_at__isnull = True), name = 'digest_unsent_idx'),
+        ]
+
+    def __str__ (self) :
+        return f'{len(self.items)} items low for household {self.household_id} until {self.window_end}'
+
+
+class JobCheckpoint (models.Model) :
+    # how far a periodic job has got, pending_position is the window of a run that has not finished
+    name = models.CharField(max_length = 50, unique = True, null = False, blank = False)
+    position = models.DateTimeField(null = True, blank = True)
+    pending_position = models.DateTimeField(null = True, blank = True)
+    updated_at = models.DateTimeField(auto_now = True)
+
+    def __str__ (self) :
+        return f'{self.name} at {self.position}'
+
+
+class Tombstone (models.Model) :
+    # a deleted store or item, kept so a client syncing from a token before the delete learns of it
+    STORE = 'store'
+    ITEM = 'item'
+    KINDS = [(STORE, 'Store'), (ITEM, 'Item')]
+
+    household = models.ForeignKey(Household, on_delete = models.CASCADE, related_name = 'tombstones', null = False, blank = False, db_index = False)
+    kind = models.CharField(max_length = 5, choices = KINDS, null = False, blank = False)
+    object_id = models.BigIntegerField(null = False, blank = False)
+    change_seq = ChangeSeqField(default = 0, editable = False)
+    created_at = models.DateTimeField(auto_now_add = True, db_index = True)
+
+    class Meta :
+        # deletes since a sync token
+        indexes = [
+            models.Index(fields = ['household', 'change_seq'], name = 'tombstone_household_change_idx'),
+        ]
+
+    @classmethod
+    def record (cls, rows) :
+        # rows are (kind, object id, household id), written in one insert
+        cls.objects.bulk_create([cls(kind = kind, object_id = object_id, household_id = household_id) for kind, object_id, household_id in rows])
 
     def __str__ (self) :
-        return f'{self.name} from {self.store.name}'
\ No newline at end of file
+        return f'{self.kind} {self.object_id} deleted from household {self.household_id}'
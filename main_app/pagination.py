@@ -0,0 +1,144 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.db import connections
+from django.db.models import F, Q
+from django.http import Http404
+
+CURSOR_SALT = 'main_app.pagination.cursor'
+
+def estimate_count (queryset) :
+    # planner row estimate on postgres, so counting a big store costs the same as a small one
+    connection = connections[queryset.db]
+
+    if connection.vendor != 'postgresql' :
+        return queryset.count()
+
+    sql, params = queryset.order_by().values('id').query.get_compiler(using = queryset.db).as_sql()
+
+    with connection.cursor() as cursor :
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str) :
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+async def aestimate_count (queryset) :
+    if connections[queryset.db].vendor != 'postgresql' :
+        return await queryset.acount()
+
+    # django has no async raw cursor yet
+    return await sync_to_async(estimate_count)(queryset)
+
+
+class KeysetPage :
+    def __init__ (self, object_list, next_cursor, previous_cursor, estimated_count = None) :
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_count = estimated_count
+        self.keyset = True
+
+    def has_next (self) :
+        return self.next_cursor is not None
+
+    def has_previous (self) :
+        return self.previous_cursor is not None
+
+    def has_other_pages (self) :
+        return self.has_next() or self.has_previous()
+
+    def __iter__ (self) :
+        return iter(self.object_list)
+
+    def __len__ (self) :
+        return len(self.object_list)
+
+
+class KeysetPaginator :
+    # pages over (key ascending with nulls last, id ascending) without OFFSET or COUNT(*)
+
+    def __init__ (self, queryset, per_page, key = 'stock_ratio', estimated_count = None) :
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key = key
+        self.estimated_count = estimated_count
+
+    def encode_cursor (self, item, direction) :
+        return signing.dumps([getattr(item, self.key), item.id, direction], salt = CURSOR_SALT)
+
+    def decode_cursor (self, cursor) :
+        try :
+            value, item_id, direction = signing.loads(cursor, salt = CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError) :
+            raise Http404('Invalid page cursor')
+
+        if direction not in ('next', 'previous') :
+            raise Http404('Invalid page cursor')
+
+        return value, item_id, direction
+
+    def forward_ordering (self) :
+        return [F(self.key).asc(nulls_last = True), 'id']
+
+    def backward_ordering (self) :
+        return [F(self.key).desc(nulls_first = True), '-id']
+
+    def after (self, value, item_id) :
+        if value is None :
+            return Q(**{ f'{self.key}__isnull': True, 'id__gt': item_id })
+
+        return (
+            Q(**{ f'{self.key}__gt': value })
+            | Q(**{ self.key: value, 'id__gt': item_id })
+            | Q(**{ f'{self.key}__isnull': True })
+        )
+
+    def before (self, value, item_id) :
+        if value is None :
+            return Q(**{ f'{self.key}__isnull': False }) | Q(**{ f'{self.key}__isnull': True, 'id__lt': item_id })
+
+        return Q(**{ f'{self.key}__lt': value }) | Q(**{ self.key: value, 'id__lt': item_id })
+
+    def page_query (self, cursor = None, last = False) :
+        # one extra row tells us whether there is anything beyond this page
+        limit = self.per_page + 1
+
+        if last :
+            return self.queryset.order_by(*self.backward_ordering())[:limit], 'last'
+
+        if cursor :
+            value, item_id, direction = self.decode_cursor(cursor)
+
+            if direction == 'next' :
+                return self.queryset.filter(self.after(value, item_id)).order_by(*self.forward_ordering())[:limit], direction
+
+            return self.queryset.filter(self.before(value, item_id)).order_by(*self.backward_ordering())[:limit], direction
+
+        return self.queryset.order_by(*self.forward_ordering())[:limit], 'first'
+
+    def build_page (self, rows, direction) :
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction in ('last', 'previous') :
+            rows = rows[::-1]
+            more_before, more_after = more, direction == 'previous'
+        else :
+            more_before, more_after = direction == 'next', more
+
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and more_after else None
+        previous_cursor = self.encode_cursor(rows[0], 'previous') if rows and more_before else None
+
+        return KeysetPage(rows, next_cursor, previous_cursor, self.estimated_count)
+
+    def page (self, cursor = None, last = False) :
+        queryset, direction = self.page_query(cursor, last)
+        return self.build_page(list(queryset), direction)
+
+    async def apage (self, cursor = None, last = False) :
+        queryset, direction = self.page_query(cursor, last)
+        return self.build_page([row async for row in queryset], direction)
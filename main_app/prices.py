@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, Count, Max, Window
+from django.db.models.functions import RowNumber
+
+from .cache import get_household_version
+from .models import Item, Store
+
+PRICE_CACHE_TIMEOUT = 60 * 60
+
+PRICE_FIELDS = ['id', 'name', 'unit', 'price', 'store_id', 'listing_count', 'highest_price']
+
+def price_listings (household_id) :
+    # one pass over item_household_name_price_idx, which is already in (name, price, id) order,
+    # so the first row of each name is its cheapest listing and no self join is needed
+    by_name = { 'partition_by': [F('name')] }
+
+    return (
+        Item.objects.filter(household = household_id)
+        .annotate(
+            price_rank = Window(RowNumber(), order_by = [F('price').asc(), F('id').asc()], **by_name),
+            listing_count = Window(Count('id'), **by_name),
+            highest_price = Window(Max('price'), **by_name),
+        )
+        .filter(price_rank = 1)
+        .order_by('name')
+        .values(*PRICE_FIELDS)
+    )
+
+def build_cheapest_prices (household_id) :
+    # store names come from a second small query, a join inside the window would cost the index order
+    rows = list(price_listings(household_id))
+    store_names = dict(Store.objects.filter(household = household_id).values_list('id', 'name'))
+
+    for row in rows :
+        row['store_name'] = store_names.get(row['store_id'])
+        # sqlite hands computed decimals back unscaled
+        row['highest_price'] = Decimal(row['highest_price']).quantize(Decimal('0.01'))
+
+    return rows
+
+def get_cheapest_prices (household_id) :
+    # a price change is an item write, which bumps the household data version
+    key = f'cheapest_prices:{household_id}:{get_household_version(household_id)}'
+    prices = cache.get(key)
+
+    if prices is None :
+        prices = build_cheapest_prices(household_id)
+        cache.set(key, prices, PRICE_CACHE_TIMEOUT)
+
+    return prices
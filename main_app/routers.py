@@ -0,0 +1,230 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ROUTED_APPS = { 'main_app' }
+PRIMARY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_route = contextvars.ContextVar('database_route', default = None)
+_end = object()
+
+
+class Route :
+    # where the current request or job reads and writes main_app rows
+
+    def __init__ (self, household_id = None, alias = None) :
+        self.household_id = household_id
+        self.alias = alias
+        self.replica = False
+
+
+def shards () :
+    return getattr(settings, 'DATABASE_SHARDS', None) or [DEFAULT_DB_ALIAS]
+
+def replicas_for (alias) :
+    return getattr(settings, 'DATABASE_REPLICAS', {}).get(alias, [])
+
+def primary_for (alias) :
+    for primary, replicas in getattr(settings, 'DATABASE_REPLICAS', {}).items() :
+        if alias in replicas :
+            return primary
+
+    return alias
+
+def shard_for (household_id) :
+    # household ids come from one sequence (reserve_household_ids), so the modulo spreads them
+    # evenly and a household never moves while the shard list stays the same
+    aliases = shards()
+    return aliases[household_id % len(aliases)] if household_id else aliases[0]
+
+def reserve_household_ids (count) :
+    # taken before the insert, each id decides which shard its household is written to
+    from .models import Household
+
+    connection = connections[shards()[0]]
+
+    if connection.vendor == 'postgresql' :
+        with connection.cursor() as cursor :
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)', [Household._meta.db_table, 'id', count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    # other backends have no shared sequence, fine for local testing with a single writer
+    start = 1 + max(Household.objects.using(alias).order_by('-id').values_list('id', flat = True).first() or 0 for alias in shards())
+    return list(range(start, start + count))
+
+def reserve_household_id () :
+    return reserve_household_ids(1)[0]
+
+def find_household (**address) :
+    # a login only knows the address, so each shard is asked in turn, there are only a few
+    from .models import Household
+
+    for alias in shards() :
+        household = Household.objects.using(alias).filter(**address).first()
+
+        if household :
+            return household
+
+    return None
+
+async def afind_household (**address) :
+    from .models import Household
+
+    for alias in shards() :
+        household = await Household.objects.using(alias).filter(**address).afirst()
+
+        if household :
+            return household
+
+    return None
+
+@contextmanager
+def database_route (household_id = None, alias = None, route = None) :
+    # every query inside goes to the route's shard, the middleware opens one per request and
+    # jobs, which have no session to take a household from, name a shard alias
+    token = _route.set(route or Route(household_id, alias))
+
+    try :
+        yield
+    finally :
+        _route.reset(token)
+
+def routed_stream (route, content) :
+    # a streamed body is read after the view has returned, so each chunk is made under the route again
+    content = iter(content)
+
+    while True :
+        with database_route(route = route) :
+            chunk = next(content, _end)
+
+        if chunk is _end :
+            return
+
+        yield chunk
+
+def reads_primary (request) :
+    # read your writes: the client that wrote skips the replicas until they have caught up. other
+    # members may read a lagging replica, its version column lags with the rows, so what they cache
+    # is stale only under the old version
+    return bool(request.COOKIES.get(PRIMARY_COOKIE))
+
+
+class HouseholdRouter :
+    # main_app rows live on the shard of the household they belong to, contrib tables on default.
+    # reads in views marked replica_reads go to one of the shard's replicas
+
+    def primary (self, model, hints) :
+        route = _route.get()
+
+        if route and route.alias :
+            return route.alias
+
+        instance = hints.get('instance')
+
+        if instance is not None :
+            # __dict__, a deferred household_id would be loaded through this router again
+            household_id = instance.pk if model._meta.label == 'main_app.Household' else instance.__dict__.get('household_id')
+
+            if household_id :
+                return shard_for(household_id)
+
+            # a row read from a shard is written back to it
+            if instance._state.db :
+                return primary_for(instance._state.db)
+
+        return shard_for(route.household_id if route else None)
+
+    def db_for_read (self, model, **hints) :
+        if model._meta.app_label not in ROUTED_APPS :
+            return None
+
+        alias = self.primary(model, hints)
+        route = _route.get()
+        replicas = replicas_for(alias)
+
+        if route and route.replica and replicas :
+            return random.choice(replicas)
+
+        return alias
+
+    def db_for_write (self, model, **hints) :
+        if model._meta.app_label not in ROUTED_APPS :
+            return None
+
+        return self.primary(model, hints)
+
+    def allow_relation (self, obj1, obj2, **hints) :
+        if { obj1._meta.app_label, obj2._meta.app_label } - ROUTED_APPS :
+            return None
+
+        # a replica holds the same rows as its shard
+        return primary_for(obj1._state.db) == primary_for(obj2._state.db)
+
+    def allow_migrate (self, db, app_label, model_name = None, **hints) :
+        if primary_for(db) != db :
+            return False
+
+        if app_label in ROUTED_APPS :
+            return db in shards()
+
+        return db == DEFAULT_DB_ALIAS
+
+
+class DatabaseRoutingMiddleware :
+    # sets the household route for the request from its session, goes after SessionMiddleware
+    sync_capable = True
+    async_capable = True
+
+    def __init__ (self, get_response) :
+        self.get_response = get_response
+
+        if iscoroutinefunction(get_response) :
+            markcoroutinefunction(self)
+
+    def __call__ (self, request) :
+        if iscoroutinefunction(self) :
+            return self.__acall__(request)
+
+        route = Route(request.session.get('household'))
+
+        with database_route(route = route) :
+            response = self.get_response(request)
+
+        return self.finish(request, route, response)
+
+    async def __acall__ (self, request) :
+        # imported here, main_app.middleware imports the models and the models import this module
+        from .middleware import asession
+
+        route = Route((await asession(request)).get('household'))
+
+        with database_route(route = route) :
+            response = await self.get_response(request)
+
+        return self.finish(request, route, response)
+
+    def process_view (self, request, view_func, view_args, view_kwargs) :
+        route = _route.get()
+        view_class = getattr(view_func, 'view_class', None)
+
+        if route and request.method in SAFE_METHODS and getattr(view_class, 'replica_reads', False) :
+            route.replica = bool(replicas_for(shard_for(route.household_id))) and not reads_primary(request)
+
+        return None
+
+    def finish (self, request, route, response) :
+        if response.streaming and not response.is_async :
+            response.streaming_content = routed_stream(route, response.streaming_content)
+
+        if request.method not in SAFE_METHODS and getattr(settings, 'DATABASE_REPLICAS', None) :
+            sticky = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age = sticky, httponly = True, samesite = 'Lax')
+
+        return response
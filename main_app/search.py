@@ -0,0 +1,151 @@
+import re
+import threading
+from collections import OrderedDict
+
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.db import connections
+from django.db.models import F, Q, Func, BigIntegerField, FloatField, Value
+from django.db.models.functions import Cast, Greatest
+
+from .cache import get_household_version
+from .models import Item
+
+SEARCH_LIMIT = 20
+AUTOCOMPLETE_LIMIT = 10
+# pg_trgm's default similarity threshold
+SIMILARITY_THRESHOLD = 0.3
+# households whose in-memory fallback index is kept per process
+FALLBACK_INDEX_SIZE = 32
+
+SEARCH_FIELDS = ['id', 'name', 'description', 'unit', 'price', 'current_stock', 'store_id', 'store__name']
+
+
+class Similarity (Func) :
+    function = 'SIMILARITY'
+    output_field = FloatField()
+
+
+def normalize_term (term) :
+    # item names and descriptions are stored lowercased, see Item.normalize
+    return ' '.join(term.strip().lower().split())
+
+def trigrams (text) :
+    # the same trigrams pg_trgm extracts: per word, padded with two spaces before and one after
+    grams = set()
+
+    for word in re.findall(r'[^\W_]+', text.lower()) :
+        padded = f'  {word} '
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+
+    return grams
+
+def similarity (left, right) :
+    if not left or not right :
+        return 0.0
+
+    return len(left & right) / len(left | right)
+
+
+class TrigramIndex :
+    # inverted trigram index over one household's items, the sqlite stand in for the gin indexes
+
+    def __init__ (self, rows) :
+        self.rows = {}
+        self.grams = {}
+        self.postings = {}
+
+        for row in rows :
+            self.rows[row['id']] = row
+            name_grams, description_grams = trigrams(row['name']), trigrams(row['description'])
+            self.grams[row['id']] = (name_grams, description_grams)
+
+            for gram in name_grams | description_grams :
+                self.postings.setdefault(gram, set()).add(row['id'])
+
+    def search (self, term, limit) :
+        term_grams = trigrams(term)
+        candidates = set()
+
+        for gram in term_grams :
+            candidates |= self.postings.get(gram, set())
+
+        results = []
+
+        for item_id in candidates | self.substring_matches(term, candidates) :
+            row = self.rows[item_id]
+            name_grams, description_grams = self.grams[item_id]
+            rank = max(similarity(term_grams, name_grams), similarity(term_grams, description_grams))
+
+            if rank >= SIMILARITY_THRESHOLD or term in row['name'] or term in row['description'] :
+                results.append((rank, row))
+
+        results.sort(key = lambda result : (-result[0], result[1]['name'], result[1]['id']))
+        return [dict(row, rank = rank) for rank, row in results[:limit]]
+
+    def substring_matches (self, term, candidates) :
+        # terms shorter than a trigram can still match as substrings
+        if len(term) >= 3 :
+            return set()
+
+        return { item_id for item_id, row in self.rows.items() if term in row['name'] or term in row['description'] }
+
+
+_fallback_indexes = OrderedDict()
+_fallback_lock = threading.Lock()
+
+def fallback_index (household_id) :
+    # rebuilt whenever the household data version moves
+    key = (household_id, get_household_version(household_id))
+
+    with _fallback_lock :
+        if key in _fallback_indexes :
+            _fallback_indexes.move_to_end(key)
+            return _fallback_indexes[key]
+
+    rows = Item.objects.filter(household = household_id).values(*SEARCH_FIELDS)
+    index = TrigramIndex(rows)
+
+    with _fallback_lock :
+        _fallback_indexes[key] = index
+
+        while len(_fallback_indexes) > FALLBACK_INDEX_SIZE :
+            _fallback_indexes.popitem(last = False)
+
+    return index
+
+def postgres_matches (household_id, term) :
+    # % and LIKE both use the (household_id, gin_trgm_ops) indexes from migration 0015, filtered
+    # on the item's own household column so only this household's entries are read
+    rank = Greatest(Similarity(F('name'), Value(term)), Similarity(F('description'), Value(term)))
+    matches = (
+        Q(TrigramSimilar(F('name'), term)) | Q(TrigramSimilar(F('description'), term))
+        | Q(name__contains = term) | Q(description__contains = term)
+    )
+
+    # bigint on both sides, btree_gin only indexes same type comparisons and a bare id is an integer
+    household = Cast(Value(household_id), BigIntegerField())
+    return Item.objects.filter(matches, household = household).annotate(rank = rank).order_by('-rank', 'name', 'id')
+
+def postgres_search (household_id, term, limit) :
+    return list(postgres_matches(household_id, term).values(*SEARCH_FIELDS, 'rank')[:limit])
+
+def search_items (household_id, term, limit = SEARCH_LIMIT) :
+    term = normalize_term(term)
+
+    if not term :
+        return []
+
+    if connections[Item.objects.db].vendor == 'postgresql' :
+        return postgres_search(household_id, term, limit)
+
+    return fallback_index(household_id).search(term, limit)
+
+def autocomplete (household_id, term, limit = AUTOCOMPLETE_LIMIT) :
+    # distinct names in rank order, the same product is often tracked at several stores
+    names = []
+
+    for row in search_items(household_id, term, limit * 3) :
+        if row['name'] not in names :
+            names.append(row['name'])
+
+    return names[:limit]
@@ -0,0 +1,214 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SESSION_CLEANUP_BATCH_SIZE = 1000
+
+
+def write_sessions (pending) :
+    # one upsert for every saved session and one delete for every dropped one
+    saved = [
+        Session(session_key = session_key, session_data = row[0], expire_date = row[1])
+        for session_key, row in pending.items() if row is not None
+    ]
+    deleted = [session_key for session_key, row in pending.items() if row is None]
+
+    with transaction.atomic() :
+        if saved :
+            Session.objects.bulk_create(
+                saved, update_conflicts = True, unique_fields = ['session_key'], update_fields = ['session_data', 'expire_date'],
+            )
+
+        if deleted :
+            Session.objects.filter(session_key__in = deleted).delete()
+
+
+class SessionWriter :
+    # database copies of cached sessions, written from one background thread so a request
+    # never waits on them. writes to the same key between flushes collapse into the last one
+
+    def __init__ (self, interval) :
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.pending = {}
+        self.counters = { 'written': 0, 'deleted': 0, 'failed': 0, 'skipped': 0 }
+
+    def put (self, session_key, row) :
+        with self.lock :
+            self.pending[session_key] = row
+
+            # started lazily, and again in a forked worker whose parent's thread did not come along
+            if self.thread is None or not self.thread.is_alive() :
+                if self.thread is None :
+                    atexit.register(self.flush)
+
+                self.thread = threading.Thread(target = self.run, name = 'session-writer', daemon = True)
+                self.thread.start()
+
+    def skip (self) :
+        with self.lock :
+            self.counters['skipped'] += 1
+
+    def run (self) :
+        while True :
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush (self) :
+        with self.lock :
+            pending, self.pending = self.pending, {}
+
+        if not pending :
+            return
+
+        try :
+            write_sessions(pending)
+        except DatabaseError :
+            logger.exception('session write behind failed, retrying on the next flush')
+
+            with self.lock :
+                self.counters['failed'] += 1
+
+                # anything written again since is newer than what failed
+                for session_key, row in pending.items() :
+                    self.pending.setdefault(session_key, row)
+        else :
+            with self.lock :
+                self.counters['deleted'] += sum(1 for row in pending.values() if row is None)
+                self.counters['written'] += sum(1 for row in pending.values() if row is not None)
+        finally :
+            # this thread's connections go back after every flush, not held between them
+            connections.close_all()
+
+    def stats (self) :
+        with self.lock :
+            return { 'pending': len(self.pending), **self.counters }
+
+
+writer = SessionWriter(interval = getattr(settings, 'SESSION_WRITE_BEHIND_INTERVAL', 1))
+
+def shared_cache () :
+    return getattr(settings, 'SESSION_CACHE_SHARED', False)
+
+def write_behind () :
+    # without a shared cache the database copy is the only one every process sees, so it is
+    # written as the session is saved instead
+    return shared_cache() and getattr(settings, 'SESSION_WRITE_BEHIND', False)
+
+def database_copy () :
+    return write_behind() or not shared_cache()
+
+def check_session_cache () :
+    # each process would keep its own sessions, so a login or logout would only reach one worker
+    if settings.SESSION_ENGINE == __name__ and not shared_cache() and getattr(settings, 'WEB_CONCURRENCY', 1) > 1 :
+        raise ImproperlyConfigured('More than one worker needs a shared session cache, set SESSION_CACHE_URL.')
+
+def clear_expired_sessions (batch_size = SESSION_CLEANUP_BATCH_SIZE, now = None) :
+    # expired rows go in small batches off the expire_date index, each its own short transaction,
+    # and rows another writer has locked are left for the next run instead of waited on
+    now = now or timezone.now()
+    removed = 0
+
+    while True :
+        with transaction.atomic() :
+            session_keys = list(
+                Session.objects.select_for_update(skip_locked = True)
+                .filter(expire_date__lt = now)
+                .order_by('expire_date')
+                .values_list('session_key', flat = True)[:batch_size]
+            )
+
+            if not session_keys :
+                return removed
+
+            removed += Session.objects.filter(session_key__in = session_keys).delete()[0]
+
+
+class SessionStore (CacheSessionStore) :
+    # the household and member ids live in the cache, so reading a session never queries the
+    # database. a copy also goes to django_session, from a background thread with SESSION_WRITE_BEHIND
+    # and a shared cache or as the session is saved without one, and is only read back when the cache
+    # has lost the session
+
+    cache_key_prefix = 'main_app.sessions'
+
+    def serialized (self, session_data) :
+        return self.serializer().dumps(session_data)
+
+    def load_from_database (self) :
+        row = Session.objects.filter(session_key = self.session_key, expire_date__gt = timezone.now()).first()
+
+        if row is None :
+            return None
+
+        session_data = self.decode(row.session_data)
+        expiry = int((row.expire_date - timezone.now()).total_seconds())
+
+        if expiry > 0 :
+            self._cache.add(self.cache_key, session_data, expiry)
+
+        return session_data
+
+    def load (self) :
+        try :
+            session_data = self._cache.get(self.cache_key)
+        except Exception :
+            session_data = None
+
+        if session_data is None and self.session_key and database_copy() :
+            session_data = self.load_from_database()
+
+        if session_data is None :
+            self._session_key = None
+            session_data = {}
+
+        self._stored = self.serialized(session_data)
+        return session_data
+
+    def save (self, must_create = False) :
+        if self.session_key is None :
+            return self.create()
+
+        session_data = self._get_session(no_load = must_create)
+        stored = self.serialized(session_data)
+
+        # login views set the same ids again on every submit, which need not be written
+        if not must_create and stored == getattr(self, '_stored', None) :
+            writer.skip()
+            return
+
+        super().save(must_create = must_create)
+        self._stored = stored
+
+        row = (self.encode(session_data), self.get_expiry_date())
+
+        if write_behind() :
+            writer.put(self.session_key, row)
+        elif database_copy() :
+            write_sessions({ self.session_key: row })
+
+    def delete (self, session_key = None) :
+        session_key = session_key or self.session_key
+        super().delete(session_key)
+
+        if session_key and write_behind() :
+            writer.put(session_key, None)
+        elif session_key and database_copy() :
+            write_sessions({ session_key: None })
+
+    @classmethod
+    def clear_expired (cls) :
+        # the cache expires its own entries, only the database copies need removing
+        clear_expired_sessions()
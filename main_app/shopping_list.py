@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, DecimalField, ExpressionWrapper
+
+from .cache import get_household_version
+from .models import Item
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+
+def build_shopping_list (household_id) :
+    # one joined query for every store, grouped in python
+    reorder_quantity = F('ideal_stock') - F('current_stock')
+    rows = Item.objects.filter(
+        store__household = household_id,
+        current_stock__lte = F('minimum_stock'),
+        current_stock__lt = F('ideal_stock'),
+    ).annotate(
+        reorder_quantity = reorder_quantity,
+        estimated_cost = ExpressionWrapper(
+            F('price') * reorder_quantity,
+            output_field = DecimalField(max_digits = 12, decimal_places = 2)
+        ),
+    ).values(
+        'id', 'name', 'unit', 'price', 'current_stock', 'minimum_stock', 'ideal_stock',
+        'reorder_quantity', 'estimated_cost', 'store_id', 'store__name',
+    ).order_by('store__name', 'name')
+
+    stores = []
+    total_cost = Decimal('0.00')
+
+    for row in rows :
+        if not stores or stores[-1]['id'] != row['store_id'] :
+            stores.append({ 'id': row['store_id'], 'name': row['store__name'], 'items': [], 'estimated_cost': Decimal('0.00') })
+
+        store = stores[-1]
+        estimated_cost = Decimal(row['estimated_cost']).quantize(Decimal('0.01'))
+        store['items'].append({
+            'id': row['id'],
+            'name': row['name'],
+            'unit': row['unit'],
+            'price': row['price'],
+            'current_stock': row['current_stock'],
+            'minimum_stock': row['minimum_stock'],
+            'ideal_stock': row['ideal_stock'],
+            'reorder_quantity': row['reorder_quantity'],
+            'estimated_cost': estimated_cost,
+        })
+        store['estimated_cost'] += estimated_cost
+        total_cost += estimated_cost
+
+    return { 'stores': stores, 'estimated_cost': total_cost }
+
+def get_shopping_list (household_id) :
+    # keyed on the household data version, so any item write makes the old entry unreachable
+    key = f'shopping_list:{household_id}:{get_household_version(household_id)}'
+    shopping_list = cache.get(key)
+
+    if shopping_list is None :
+        shopping_list = build_shopping_list(household_id)
+        cache.set(key, shopping_list, SHOPPING_LIST_CACHE_TIMEOUT)
+
+    return shopping_list
@@ -0,0 +1,42 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_household_versions
+from .live import publish_items
+from .middleware import forget_household
+from .models import Household, Store, Item, Tombstone, households_for_items
+
+def deleted_from (origin, model) :
+    # whether a delete was started on a model instance or a queryset of it, deletes cascade from there
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+@receiver([post_save, post_delete], sender = Household)
+def household_changed (sender, instance, **kwargs) :
+    forget_household(instance.id)
+
+@receiver([post_save, post_delete], sender = Store)
+def store_changed (sender, instance, using, **kwargs) :
+    bump_household_versions([instance.household_id], using)
+
+@receiver([post_save, post_delete], sender = Item)
+def item_changed (sender, instance, using, **kwargs) :
+    # save() keeps household_id filled, so this never needs a store lookup
+    bump_household_versions(households_for_items([instance]), using)
+    publish_items([instance], deleted = kwargs['signal'] is post_delete)
+
+@receiver(pre_delete, sender = Store)
+def store_deleting (sender, instance, origin = None, **kwargs) :
+    # one insert for the store and every item cascading with it. a deleted household takes its
+    # tombstones along, so there is nothing to record then
+    if deleted_from(origin, Household) :
+        return
+
+    items = instance.items.values_list('id', flat = True)
+    Tombstone.record([(Tombstone.STORE, instance.id, instance.household_id)] + [(Tombstone.ITEM, item_id, instance.household_id) for item_id in items])
+
+@receiver(post_delete, sender = Item)
+def item_deleted (sender, instance, origin = None, **kwargs) :
+    # store deletes and ItemQuerySet.delete() record their items in bulk
+    if isinstance(origin, Item) :
+        Tombstone.record([(Tombstone.ITEM, instance.id, instance.household_id)])
@@ -0,0 +1,70 @@
+from django.db import router, transaction
+from django.db.models import Case, When, F, Value, IntegerField
+from django.db.models.functions import Greatest
+
+from .live import LIVE_FIELDS, publish_item_changes
+from .models import Item
+from .usage import record_stock_deltas
+
+MAX_STOCK_CHANGES = 500
+
+class StockUpdateError (Exception) :
+    pass
+
+def parse_stock_deltas (data) :
+    # {"item_id": delta} with integer ids and deltas, zero deltas are dropped
+    if not isinstance(data, dict) :
+        raise StockUpdateError('Expected an object of item ids to stock changes')
+
+    if len(data) > MAX_STOCK_CHANGES :
+        raise StockUpdateError(f'At most {MAX_STOCK_CHANGES} items can be updated at once')
+
+    deltas = {}
+
+    for item_id, delta in data.items() :
+        try :
+            item_id = int(item_id)
+        except (TypeError, ValueError) :
+            raise StockUpdateError(f'Invalid item id: {item_id}')
+
+        if isinstance(delta, bool) or not isinstance(delta, int) :
+            raise StockUpdateError(f'Stock change for item {item_id} must be a whole number')
+
+        if delta :
+            deltas[item_id] = delta
+
+    return deltas
+
+def apply_stock_deltas (household, deltas, store = None) :
+    # one UPDATE with per row increments, so concurrent members never overwrite each other
+    if not deltas :
+        return {}, []
+
+    items = Item.objects.filter(store__household = household, id__in = deltas.keys())
+
+    if store is not None :
+        items = items.filter(store = store)
+
+    current_stock = Greatest(
+        Case(
+            *[When(id = item_id, then = F('current_stock') + Value(delta)) for item_id, delta in deltas.items()],
+            default = F('current_stock'),
+            output_field = IntegerField()
+        ),
+        Value(0)
+    )
+
+    with transaction.atomic(using = router.db_for_write(Item)) :
+        # locked first, so nothing moves the stock between this read and the update. only the item
+        # rows, the store join would otherwise lock the store for every member updating it
+        before = dict(items.select_for_update(of = ('self',)).order_by('id').values_list('id', 'current_stock'))
+        items.update(current_stock = current_stock)
+        # read back with the fields live clients are sent, rather than a second query for them
+        changes = list(items.values(*LIVE_FIELDS))
+        stock = { change['id']: change['current_stock'] for change in changes }
+        # stock stops at 0, so the events get what was actually applied, not what was asked for
+        record_stock_deltas({ item_id: stock[item_id] - before[item_id] for item_id in stock })
+        publish_item_changes(household.id, changes)
+
+    missing = sorted(set(deltas) - set(stock))
+    return stock, missing
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Store, Item, Tombstone
+
+SYNC_SALT = 'main_app.sync.token'
+SYNC_PAGE_SIZE = 1000
+# tokens older than this get a full resync, tombstones are kept a day longer than any token lives
+SYNC_TOKEN_MAX_AGE = 30 * 24 * 60 * 60
+TOMBSTONE_PRUNE_BATCH_SIZE = 5000
+
+class SyncTokenError (Exception) :
+    pass
+
+class SyncTokenExpired (SyncTokenError) :
+    pass
+
+def token_max_age () :
+    return getattr(settings, 'SYNC_TOKEN_MAX_AGE', SYNC_TOKEN_MAX_AGE)
+
+def change_watermark (alias) :
+    # every write stamped below this had finished, committed or not, when it was read. a write
+    # still open may carry any stamp at or above it, so the next sync starts from here
+    connection = connections[alias]
+
+    with connection.cursor() as cursor :
+        if connection.vendor == 'postgresql' :
+            cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        else :
+            # no way to see open transactions, fine for local testing with a single writer
+            cursor.execute("SELECT CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER)")
+
+        return cursor.fetchone()[0]
+
+def encode_token (since, upto = None, after = None) :
+    # since: the watermark this sync reads from. upto and after are only set between the pages
+    # of one sync, the watermark it will finish at and the last item sent
+    return signing.dumps([since, upto, after], salt = SYNC_SALT)
+
+def decode_token (token) :
+    try :
+        since, upto, after = signing.loads(token, salt = SYNC_SALT, max_age = token_max_age())
+    except signing.SignatureExpired :
+        raise SyncTokenExpired('Sync token expired, sync again without a token')
+    except (signing.BadSignature, TypeError, ValueError) :
+        raise SyncTokenError('Invalid sync token')
+
+    return since, upto, after
+
+def changes_since (household, token = None, page_size = SYNC_PAGE_SIZE) :
+    # stores, items and deletes of a household since token, or everything without one. reads go
+    # off the (household, change_seq) indexes, so a resync costs what changed, not the inventory.
+    # a change can come back twice, never not at all, clients apply them by id
+    since, upto, after = decode_token(token) if token else (None, None, None)
+
+    if upto is None :
+        upto = change_watermark(router.db_for_read(Item))
+
+    items = Item.objects.filter(household = household)
+
+    if since is not None :
+        items = items.filter(change_seq__gte = since)
+
+    if after is not None :
+        # the range condition lets the index start at the last item sent instead of at since
+        items = items.filter(change_seq__gte = after[0]).filter(Q(change_seq__gt = after[0]) | Q(change_seq = after[0], id__gt = after[1]))
+
+    items = list(items.order_by('change_seq', 'id')[:page_size + 1])
+    more = len(items) > page_size
+    items = items[:page_size]
+    changes = { 'items': items, 'stores': [], 'deleted': { Tombstone.STORE: [], Tombstone.ITEM: [] }, 'more': more }
+
+    # stores and deletes are few, they all go with the first page
+    if after is None :
+        stores = Store.objects.filter(household = household)
+        changes['stores'] = list(stores.order_by('id') if since is None else stores.filter(change_seq__gte = since))
+
+        if since is not None :
+            tombstones = Tombstone.objects.filter(household = household, change_seq__gte = since)
+
+            for kind, object_id in tombstones.values_list('kind', 'object_id') :
+                changes['deleted'][kind].append(object_id)
+
+    if more :
+        changes['token'] = encode_token(since, upto, [items[-1].change_seq, items[-1].id])
+    else :
+        changes['token'] = encode_token(upto)
+
+    return changes
+
+def prune_tombstones (using, now = None, batch_size = TOMBSTONE_PRUNE_BATCH_SIZE) :
+    # tombstones no live token can reach back to, in short batches off the created_at index
+    before = (now or timezone.now()) - timedelta(seconds = token_max_age()) - timedelta(days = 1)
+    removed = 0
+
+    while True :
+        with transaction.atomic(using = using) :
+            ids = list(
+                Tombstone.objects.using(using).filter(created_at__lt = before)
+                .order_by('created_at').values_list('id', flat = True)[:batch_size]
+            )
+
+            if not ids :
+                return removed
+
+            removed += Tombstone.objects.using(using).filter(id__in = ids).delete()[0]
@@ -0,0 +1,264 @@
+import io
+import random
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Household, Member, Store, Item, compute_stock_ratio
+from .routers import shards, shard_for, reserve_household_ids
+
+# every synthetic household lives in this city, numbered street addresses keep them unique
+SYNTHETIC_CITY = 'synthetic'
+SYNTHETIC_STATE = 'sy'
+SYNTHETIC_PASSCODE = 'synthetic-passcode'
+SYNTHETIC_PASSWORD = 'synthetic-password'
+# households generated and committed together, bounds memory and the size of a failed chunk
+SYNTHETIC_CHUNK_SIZE = 200
+BULK_CREATE_BATCH_SIZE = 1000
+COPY_BLOCK_SIZE = 1024 * 1024
+COPY_FORMAT_CACHE_SIZE = 100000
+
+PRODUCTS = [
+    'apples', 'bananas', 'bread', 'butter', 'carrots', 'cereal', 'cheese', 'chicken', 'coffee', 'eggs',
+    'flour', 'garlic', 'lettuce', 'milk', 'onions', 'oranges', 'pasta', 'pepper', 'potatoes', 'rice',
+    'salt', 'soap', 'spinach', 'sugar', 'tea', 'tomatoes', 'tortillas', 'yogurt', 'dish soap', 'paper towels',
+]
+VARIANTS = ['', 'organic', 'whole', 'large', 'family size', 'low fat', 'store brand', 'frozen']
+UNITS = ['each', 'lb', 'oz', 'pack', 'bag', 'box', 'bottle', 'dozen']
+NAMES = [f'{variant} {product}'.strip() for variant in VARIANTS for product in PRODUCTS]
+COPY_ESCAPES = str.maketrans({ '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r' })
+
+HOUSEHOLD_COLUMNS = ['id', 'street_address', 'city', 'state', 'zip_code', 'passcode', 'created_at', 'data_version']
+MEMBER_COLUMNS = ['id', 'name', 'password', 'created_at', 'household_id']
+STORE_COLUMNS = ['id', 'name', 'street_address', 'city', 'state', 'zip_code', 'created_at', 'updated_at', 'household_id', 'change_seq']
+ITEM_COLUMNS = [
+    'id', 'name', 'description', 'price', 'unit', 'current_stock', 'ideal_stock', 'minimum_stock',
+    'average_usage', 'stock_ratio', 'daily_usage', 'last_consumed_at', 'created_at', 'updated_at', 'store_id', 'household_id',
+    'version', 'change_seq',
+]
+STORE_HOUSEHOLD = STORE_COLUMNS.index('household_id')
+
+
+def reserve_ids (connection, model, count) :
+    # ids are assigned up front so child rows can be generated before their parents are written
+    table = model._meta.db_table
+
+    if connection.vendor == 'postgresql' :
+        with connection.cursor() as cursor :
+            # resolved once, inside generate_series it would be looked up per row
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+            sequence = cursor.fetchone()[0]
+            cursor.execute('SELECT nextval(%s::regclass) FROM generate_series(1, %s)', [sequence, count])
+            return [row[0] for row in cursor.fetchall()]
+
+    # other backends take explicit ids in bulk_create, the load is assumed to be the only writer
+    with connection.cursor() as cursor :
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(table)}')
+        start = cursor.fetchone()[0] + 1
+
+    return list(range(start, start + count))
+
+def copy_text (value) :
+    if value is None :
+        return '\\N'
+
+    if isinstance(value, str) :
+        return value.translate(COPY_ESCAPES)
+
+    if isinstance(value, datetime) :
+        return value.isoformat()
+
+    return str(value)
+
+def copy_blocks (rows, block_size = COPY_BLOCK_SIZE) :
+    # rows in COPY text format, formatted here rather than adapted value by value by the driver.
+    # generated data repeats a lot, so each distinct value is formatted once
+    formatted = {}
+    lines = []
+    size = 0
+
+    def text (value) :
+        key = (value.__class__, value)
+
+        if key not in formatted :
+            if len(formatted) >= COPY_FORMAT_CACHE_SIZE :
+                formatted.clear()
+
+            formatted[key] = copy_text(value)
+
+        return formatted[key]
+
+    for row in rows :
+        line = '\t'.join(map(text, row)) + '\n'
+        lines.append(line)
+        size += len(line)
+
+        if size >= block_size :
+            yield ''.join(lines)
+            lines, size = [], 0
+
+    if lines :
+        yield ''.join(lines)
+
+def copy_rows (connection, model, columns, rows) :
+    quote = connection.ops.quote_name
+    sql = f'COPY {quote(model._meta.db_table)} ({", ".join(quote(column) for column in columns)}) FROM STDIN'
+
+    # imported here, sqlite only installs have no postgres driver
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    with connection.cursor() as cursor :
+        if is_psycopg3 :
+            from psycopg.copy import QueuedLibpqWriter
+
+            # a writer thread sends blocks while the next ones are generated
+            with cursor.cursor.copy(sql, writer = QueuedLibpqWriter(cursor.cursor)) as copy :
+                for block in copy_blocks(rows) :
+                    copy.write(block)
+        else :
+            cursor.cursor.copy_expert(sql, io.StringIO(''.join(copy_blocks(rows))))
+
+def insert_rows (connection, model, columns, rows) :
+    if connection.vendor == 'postgresql' :
+        copy_rows(connection, model, columns, rows)
+    else :
+        # the QuerySet rather than the custom manager, rows already carry their ratio
+        objs = [model(**dict(zip(columns, row))) for row in rows]
+        model._base_manager.using(connection.alias).bulk_create(objs, batch_size = BULK_CREATE_BATCH_SIZE)
+
+@contextmanager
+def deferred_indexes (connection, model) :
+    # building an index once after the load is far cheaper than updating it per row
+    with connection.schema_editor() as editor :
+        for index in model._meta.indexes :
+            editor.remove_index(model, index)
+
+    try :
+        yield
+    finally :
+        with connection.schema_editor() as editor :
+            for index in model._meta.indexes :
+                editor.add_index(model, index)
+
+
+class SyntheticDataset :
+    # households x members x stores x items shaped like real data, every row already normalized
+    # the way the model save methods would, and within every unique and check constraint
+
+    def __init__ (self, households, members, stores, items, seed = None, start = 0) :
+        self.households = households
+        self.members = members
+        self.stores = stores
+        self.items = items
+        self.start = start
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+        # one pbkdf2 run each, shared by every generated household and member
+        self.passcode_hash = make_password(SYNTHETIC_PASSCODE)
+        self.password_hash = make_password(SYNTHETIC_PASSWORD)
+
+    def household_row (self, household_id, number) :
+        return [household_id, f'{number} synthetic ave', SYNTHETIC_CITY, SYNTHETIC_STATE, f'{number % 100000:05d}', self.passcode_hash, self.now, 0]
+
+    def member_row (self, member_id, number, household_id) :
+        return [member_id, f'member {number}', self.password_hash, self.now, household_id]
+
+    def store_row (self, store_id, number, household_id) :
+        return [
+            store_id, f'store {number}', f'{number} market st', SYNTHETIC_CITY, SYNTHETIC_STATE,
+            f'{number % 100000:05d}', self.now, self.now, household_id, 0,
+        ]
+
+    def item_row (self, item_id, store_id, household_id) :
+        # random() over randint(), this runs once per generated item
+        draw = self.random.random
+        name = NAMES[int(draw() * len(NAMES))]
+        ideal_stock = 1 + int(draw() * 12)
+        minimum_stock = int(draw() * (ideal_stock + 1))
+        current_stock = int(draw() * (ideal_stock + 4))
+
+        return [
+            item_id, name, 'synthetic ' + name, Decimal(50 + int(draw() * 2451)).scaleb(-2), UNITS[int(draw() * len(UNITS))],
+            current_stock, ideal_stock, minimum_stock, 0, compute_stock_ratio(current_stock, minimum_stock),
+            0.0, None, self.now, self.now, store_id, household_id, 1, 0,
+        ]
+
+    def chunks (self, chunk_size = SYNTHETIC_CHUNK_SIZE) :
+        for offset in range(0, self.households, chunk_size) :
+            yield range(self.start + offset, self.start + min(offset + chunk_size, self.households))
+
+    def load_shard (self, connection, households) :
+        # households are (id, number) pairs already placed on this shard, the child rows take
+        # their ids from the shard's own sequences
+        household_ids = [household_id for household_id, _ in households]
+        member_ids = iter(reserve_ids(connection, Member, len(households) * self.members))
+        store_ids = reserve_ids(connection, Store, len(households) * self.stores)
+        item_ids = iter(reserve_ids(connection, Item, len(store_ids) * self.items))
+
+        households = [self.household_row(household_id, number) for household_id, number in households]
+        members, stores = [], []
+
+        for household_id in household_ids :
+            members.extend(self.member_row(next(member_ids), number, household_id) for number in range(self.members))
+            stores.extend(self.store_row(store_ids[len(stores)], number, household_id) for number in range(self.stores))
+
+        insert_rows(connection, Household, HOUSEHOLD_COLUMNS, households)
+        insert_rows(connection, Member, MEMBER_COLUMNS, members)
+        insert_rows(connection, Store, STORE_COLUMNS, stores)
+        # items are streamed straight into COPY instead of being held in memory
+        items = (self.item_row(next(item_ids), store[0], store[STORE_HOUSEHOLD]) for store in stores for _ in range(self.items))
+        insert_rows(connection, Item, ITEM_COLUMNS, items)
+
+        return len(households), len(members), len(stores), len(store_ids) * self.items
+
+    def load_chunk (self, numbers) :
+        # household ids come from the one household sequence, as for households made in the app,
+        # and each household is written to the shard its id picks. one transaction per shard
+        by_shard = {}
+
+        for household_id, number in zip(reserve_household_ids(len(numbers)), numbers) :
+            by_shard.setdefault(shard_for(household_id), []).append((household_id, number))
+
+        totals = [0, 0, 0, 0]
+
+        for alias, households in by_shard.items() :
+            with transaction.atomic(using = alias) :
+                counts = self.load_shard(connections[alias], households)
+
+            totals = [total + count for total, count in zip(totals, counts)]
+
+        return totals
+
+    def load (self, chunk_size = SYNTHETIC_CHUNK_SIZE, progress = None, defer_indexes = False) :
+        totals = [0, 0, 0, 0]
+
+        with ExitStack() as stack :
+            if defer_indexes :
+                for alias in shards() :
+                    stack.enter_context(deferred_indexes(connections[alias], Item))
+
+            for numbers in self.chunks(chunk_size) :
+                counts = self.load_chunk(numbers)
+                totals = [total + count for total, count in zip(totals, counts)]
+
+                if progress :
+                    progress(*totals)
+
+        # fresh planner statistics, estimate_count and the keyset indexes rely on them
+        for alias in shards() :
+            connection = connections[alias]
+
+            if connection.vendor == 'postgresql' :
+                with connection.cursor() as cursor :
+                    for model in (Household, Member, Store, Item) :
+                        cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        return dict(zip(['households', 'members', 'stores', 'items'], totals))
+
+def next_synthetic_number () :
+    # continue numbering after earlier loads so household addresses stay unique
+    return sum(Household.objects.using(alias).filter(city = SYNTHETIC_CITY).count() for alias in shards())
@@ -0,0 +1,136 @@
+import json
+from contextlib import ExitStack
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .instrumentation import QUERY_BUDGETS, WRITE_QUERY_BUDGETS
+from .models import Household, Member, Store, Item
+from .routers import database_route, shard_for, PRIMARY_COOKIE
+from .urls import urlpatterns
+
+# test helpers, see tests.py
+
+ROUTE_KWARGS = ['store_id', 'item_id']
+
+
+class QueryBudgetMixin :
+    # fails when any route in main_app/urls.py runs more queries than QUERY_BUDGETS allows
+    budget_items = 30
+    # queries are counted on every alias, a sharded or replicated setup spreads them out
+    databases = '__all__'
+
+    def setUp (self) :
+        super().setUp()
+
+        # a deployment may turn on the per-process household cache, it would hide the household lookup
+        # from every route after the first
+        no_household_cache = override_settings(HOUSEHOLD_CACHE_TTL = 0)
+        no_household_cache.enable()
+        self.addCleanup(no_household_cache.disable)
+
+        self.household = Household.objects.create(street_address = '1 main st', city = 'springfield', state = 'il', zip_code = '62701', passcode = 'passcode')
+
+        # manager creates route by queryset, so the rest of the setup runs on the household's shard
+        route = database_route(household_id = self.household.id)
+        route.__enter__()
+        self.addCleanup(route.__exit__, None, None, None)
+
+        self.member = Member.objects.create(name = 'sam', password = 'password', household = self.household)
+        self.store = Store.objects.create(name = 'market', street_address = '2 main st', city = 'springfield', state = 'il', zip_code = '62701', household = self.household)
+        Item.objects.bulk_create([
+            Item(name = f'item {number}', current_stock = number % 5, minimum_stock = 2, ideal_stock = 6, price = 1, store = self.store)
+            for number in range(self.budget_items)
+        ])
+        self.item = Item.objects.filter(store = self.store).first()
+
+        session = self.client.session
+        session['household'] = self.household.id
+        session['member'] = self.member.id
+        session.save()
+        # a replica is a test mirror on its own connection, which cannot see the test's transaction
+        self.client.cookies[PRIMARY_COOKIE] = '1'
+
+    def route_kwargs (self, pattern) :
+        values = { 'store_id': self.store.id, 'item_id': self.item.id }
+        return { name: values[name] for name in ROUTE_KWARGS if f'<int:{name}>' in str(pattern.pattern) }
+
+    def write_requests (self) :
+        # (method, route, data, content type) for one row, what WRITE_QUERY_BUDGETS is sized for.
+        # content type None is a form post
+        item_row = { 'name': 'new item', 'current_stock': 1, 'minimum_stock': 1, 'ideal_stock': 4 }
+        address = { 'street_address': '1 main st', 'city': 'springfield', 'state': 'il', 'zip_code': '62701' }
+        # the stock writes move self.item's version on, so the edits go first or to another item
+        edited = Item.objects.filter(store = self.store).exclude(id = self.item.id).first()
+
+        return [
+            ('PATCH', 'api_item_detail', json.dumps({ 'version': self.item.version, 'ideal_stock': 8 }), 'application/json'),
+            ('PATCH', 'api_item_list', json.dumps({ 'items': [{ 'id': edited.id, 'version': edited.version, 'ideal_stock': 7 }] }), 'application/json'),
+            # creating a household or member signs into it, selecting signs back into the test's own
+            ('POST', 'household_create', { **address, 'street_address': '3 main st', 'passcode': 'passcode', 'passcode_confirmation': 'passcode' }, None),
+            ('POST', 'household_select', { **address, 'passcode': 'passcode' }, None),
+            ('POST', 'member_create', { 'name': 'alex', 'password': 'password', 'password_confirmation': 'password' }, None),
+            ('POST', 'member_select', { 'member_id': self.member.id, 'password': 'password' }, None),
+            ('POST', 'store_create', { **address, 'name': 'corner shop', 'street_address': '4 main st' }, None),
+            ('POST', 'item_create', item_row, None),
+            ('POST', 'item_import', {
+                'file': SimpleUploadedFile('items.csv', b'name,current_stock,minimum_stock,ideal_stock\nimported item,1,1,4\n'),
+                'format': 'csv',
+            }, None),
+            ('POST', 'stock_update', json.dumps({ str(self.item.id): 1 }), 'application/json'),
+            ('POST', 'store_stock_update', json.dumps({ str(self.item.id): -1 }), 'application/json'),
+            ('POST', 'stock_event_create', json.dumps({ 'kind': 'consume', 'quantity': 1 }), 'application/json'),
+        ]
+
+    def test_every_route_has_a_query_budget (self) :
+        missing = [pattern.name for pattern in urlpatterns if pattern.name not in QUERY_BUDGETS]
+        self.assertEqual(missing, [], 'routes without a query budget in main_app.instrumentation.QUERY_BUDGETS')
+
+    def test_routes_stay_within_query_budget (self) :
+        for pattern in urlpatterns :
+            url = reverse(pattern.name, kwargs = self.route_kwargs(pattern))
+
+            with self.subTest(route = pattern.name), ExitStack() as stack :
+                captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                response = self.client.get(url)
+
+                # a streamed body runs its queries as it is read, so it is read while still counting
+                if response.streaming :
+                    b''.join(response.streaming_content)
+
+                queries = [query for capture in captures for query in capture.captured_queries]
+
+                self.assertLessEqual(
+                    len(queries), QUERY_BUDGETS[pattern.name],
+                    f'{pattern.name} ran {len(queries)} queries:\n' + '\n'.join(query['sql'] for query in queries)
+                )
+
+    def test_writes_stay_within_query_budget (self) :
+        patterns = { pattern.name: pattern for pattern in urlpatterns }
+        requests = self.write_requests()
+        self.assertEqual({ (method, name) for method, name, _, _ in requests }, set(WRITE_QUERY_BUDGETS))
+
+        for method, name, data, content_type in requests :
+            url = reverse(name, kwargs = self.route_kwargs(patterns[name]))
+
+            with self.subTest(route = name, method = method), ExitStack() as stack :
+                captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                # the version bump runs once the write commits, which a TestCase never does on its own
+                stack.enter_context(self.captureOnCommitCallbacks(using = shard_for(self.household.id), execute = True))
+
+                if content_type is None :
+                    response = self.client.post(url, data)
+                else :
+                    response = self.client.generic(method, url, data, content_type = content_type)
+
+                # the commit callbacks run first as the stack unwinds, while the captures still count
+                stack.close()
+                queries = [query for capture in captures for query in capture.captured_queries]
+
+                self.assertLess(response.status_code, 400, response.content[:500])
+                self.assertLessEqual(
+                    len(queries), WRITE_QUERY_BUDGETS[(method, name)],
+                    f'{method} {name} ran {len(queries)} queries:\n' + '\n'.join(query['sql'] for query in queries)
+                )
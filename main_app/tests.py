@@ -0,0 +1,98 @@
+from unittest import skipUnless
+
+from django.db import connections
+from django.test import TestCase
+
+from .models import Household, Store, Item
+from .routers import database_route, shard_for
+from . import search
+from .search import search_items, autocomplete, postgres_matches
+from .testing import QueryBudgetMixin
+
+
+class RouteBudgetTests (QueryBudgetMixin, TestCase) :
+    pass
+
+
+def on_postgres () :
+    return connections['default'].vendor == 'postgresql'
+
+
+class ItemSearchTests (TestCase) :
+    # the trigram indexes on postgres, main_app.search's in-memory index anywhere else
+    databases = '__all__'
+    names = ['whole milk', 'oat milk', 'bread', 'butter']
+
+    def setUp (self) :
+        # the in-memory index is kept per process, past the rolled back rows of earlier tests
+        with search._fallback_lock :
+            search._fallback_indexes.clear()
+
+        self.households = []
+
+        for number in range(2) :
+            household = Household.objects.create(street_address = f'{number} main st', city = 'springfield', state = 'il', zip_code = '62701', passcode = 'passcode')
+
+            with database_route(household_id = household.id) :
+                store = Store.objects.create(name = 'market', street_address = '2 main st', city = 'springfield', state = 'il', zip_code = '62701', household = household)
+                Item.objects.bulk_create([
+                    Item(name = name, description = f'{name} from the market', ideal_stock = 6, minimum_stock = 2, store = store)
+                    for name in self.names
+                ])
+
+            self.households.append(household)
+
+    def search (self, term, household = None) :
+        household = household or self.households[0]
+
+        with database_route(household_id = household.id) :
+            return search_items(household.id, term)
+
+    def test_search_stays_within_household (self) :
+        for household in self.households :
+            with database_route(household_id = household.id) :
+                item_ids = set(Item.objects.filter(household = household).values_list('id', flat = True))
+
+            results = self.search('milk', household)
+
+            self.assertEqual({ row['name'] for row in results }, { 'whole milk', 'oat milk' })
+            self.assertLessEqual({ row['id'] for row in results }, item_ids)
+
+    def test_misspelled_terms_match_by_similarity (self) :
+        results = self.search('bred')
+
+        self.assertEqual(results[0]['name'], 'bread')
+        self.assertGreaterEqual(results[0]['rank'], 0.3)
+
+    def test_short_terms_match_substrings (self) :
+        self.assertEqual([row['name'] for row in self.search('oa')], ['oat milk'])
+
+    def test_autocomplete_names_are_distinct (self) :
+        household = self.households[0]
+
+        with database_route(household_id = household.id) :
+            Item.objects.create(name = 'oat milk', ideal_stock = 6, minimum_stock = 2, store = household.stores.get())
+            names = autocomplete(household.id, 'oat')
+
+        self.assertEqual(names, ['oat milk'])
+
+    @skipUnless(on_postgres(), 'the trigram indexes only exist on postgres')
+    def test_search_reads_only_household_entries (self) :
+        household = self.households[0]
+        alias = shard_for(household.id)
+
+        with connections[alias].cursor() as cursor :
+            cursor.execute("SELECT indexdef FROM pg_indexes WHERE tablename = 'main_app_item' AND indexdef LIKE '%%gin_trgm_ops%%'")
+            indexes = [row[0] for row in cursor.fetchall()]
+            # the test tables are tiny, without this the planner would rather scan them
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        self.assertEqual(len(indexes), 2)
+        self.assertTrue(all('(household_id, ' in index for index in indexes), indexes)
+
+        with database_route(household_id = household.id) :
+            plan = postgres_matches(household.id, 'milk').explain()
+
+        conditions = [line for line in plan.splitlines() if 'Index Cond' in line]
+        self.assertTrue(conditions, plan)
+        self.assertTrue(all(f"household_id = '{household.id}'::bigint" in line for line in conditions), plan)
@@ -1,8 +1,10 @@
 from django.urls import path
-from . import views
+from . import views, api, metrics
 
 urlpatterns = [
     path('', views.home, name = 'home'),
+    path('metrics', metrics.metrics, name = 'metrics'),
+    path('live', views.live_updates, name = 'live_updates'),
     
 
     path('household/select', views.HouseholdSelect.as_view(), name = 'household_select'),
@@ -14,6 +16,24 @@ urlpatterns = [
     path('stores', views.StoreList.as_view(), name = 'store_list'),
     path('stores/create', views.StoreCreate.as_view(), name = 'store_create'),
 
+    path('shopping-list', views.ShoppingList.as_view(), name = 'shopping_list'),
+    path('prices', views.CheapestPrices.as_view(), name = 'cheapest_prices'),
+    path('stock', views.StockUpdate.as_view(), name = 'stock_update'),
+    path('export', views.InventoryExport.as_view(), name = 'inventory_export'),
+
     path('stores/<int:store_id>', views.StoreItemList.as_view(), name = 'item_list'),
     path('stores/<int:store_id>/create-item', views.ItemCreate.as_view(), name = 'item_create'),
+    path('stores/<int:store_id>/import-items', views.ItemImport.as_view(), name = 'item_import'),
+    path('stores/<int:store_id>/stock', views.StockUpdate.as_view(), name = 'store_stock_update'),
+    path('stores/<int:store_id>/items/<int:item_id>/events', views.StockEventCreate.as_view(), name = 'stock_event_create'),
+
+    path('api/household', api.HouseholdDetail.as_view(), name = 'api_household'),
+    path('api/stores', api.StoreList.as_view(), name = 'api_store_list'),
+    path('api/stores/summary', api.StoreSummary.as_view(), name = 'api_store_summary'),
+    path('api/prices', api.CheapestPrices.as_view(), name = 'api_cheapest_prices'),
+    path('api/changes', api.Changes.as_view(), name = 'api_changes'),
+    path('api/search', api.ItemSearch.as_view(), name = 'api_item_search'),
+    path('api/autocomplete', api.ItemAutocomplete.as_view(), name = 'api_item_autocomplete'),
+    path('api/stores/<int:store_id>/items', api.ItemList.as_view(), name = 'api_item_list'),
+    path('api/stores/<int:store_id>/items/<int:item_id>', api.ItemDetail.as_view(), name = 'api_item_detail'),
 ]
\ No newline at end of file
@@ -0,0 +1,86 @@
+import math
+
+from django.db import router, transaction
+from django.db.models import F, Value
+from django.utils import timezone
+
+from .live import item_change, publish_item_changes
+from .models import Item, StockEvent
+
+# days for an old rate to lose ~63% of its weight
+USAGE_TIME_CONSTANT_DAYS = 14
+# shortest gap between consume events used for the instant rate
+MIN_INTERVAL_DAYS = 1 / 24
+
+def next_daily_usage (daily_usage, last_consumed_at, quantity, consumed_at) :
+    # ewma over irregular intervals, alpha grows with the gap since the previous event
+    interval = max((consumed_at - last_consumed_at).total_seconds() / 86400, MIN_INTERVAL_DAYS)
+    alpha = 1 - math.exp(-interval / USAGE_TIME_CONSTANT_DAYS)
+    return daily_usage + alpha * (quantity / interval - daily_usage)
+
+def average_usage_for (daily_usage) :
+    # average_usage is whole units per week
+    return round(daily_usage * 7)
+
+def consume_update (item, quantity, consumed_at) :
+    # field values for a consume event, given the locked item's usage state
+    daily_usage = next_daily_usage(item.daily_usage, item.last_consumed_at or item.created_at, quantity, consumed_at)
+
+    return {
+        'daily_usage': daily_usage,
+        'average_usage': average_usage_for(daily_usage),
+        'last_consumed_at': consumed_at,
+    }
+
+def record_stock_event (item_id, kind, quantity, created_at = None) :
+    # O(1) per event, history is only appended to, never re-aggregated
+    created_at = created_at or timezone.now()
+
+    # the household's shard, which is not always the default alias
+    with transaction.atomic(using = router.db_for_write(Item)) :
+        item = Item.objects.select_for_update().only('current_stock', 'daily_usage', 'last_consumed_at', 'created_at').get(id = item_id)
+
+        # stock stops at 0, the event and usage get what was actually taken, not what was asked for
+        if kind == StockEvent.CONSUME :
+            quantity = min(quantity, item.current_stock)
+
+        if quantity :
+            StockEvent.objects.create(item_id = item_id, kind = kind, quantity = quantity, created_at = created_at)
+            fields = { 'current_stock': F('current_stock') + Value(quantity if kind == StockEvent.RESTOCK else -quantity) }
+
+            if kind == StockEvent.CONSUME :
+                fields.update(consume_update(item, quantity, created_at))
+
+            Item.objects.filter(id = item_id).update(**fields)
+
+    item = Item.objects.get(id = item_id)
+    publish_item_changes(item.household_id, [item_change(item)])
+    return item
+
+def record_stock_deltas (deltas, created_at = None) :
+    # event rows and usage for the batch stock endpoint, inside its transaction. deltas are the
+    # changes applied, an item whose stock was already 0 gets no consume event
+    created_at = created_at or timezone.now()
+    deltas = { item_id: delta for item_id, delta in deltas.items() if delta }
+
+    StockEvent.objects.bulk_create([
+        StockEvent(
+            item_id = item_id,
+            kind = StockEvent.RESTOCK if delta > 0 else StockEvent.CONSUME,
+            quantity = abs(delta),
+            created_at = created_at,
+        )
+        for item_id, delta in deltas.items()
+    ])
+
+    consumed = { item_id: -delta for item_id, delta in deltas.items() if delta < 0 }
+    items = list(
+        Item.objects.select_for_update().filter(id__in = consumed)
+            .only('daily_usage', 'last_consumed_at', 'created_at', 'store_id', 'household_id')
+    )
+
+    for item in items :
+        item.__dict__.update(consume_update(item, consumed[item.id], created_at))
+
+    if items :
+        Item.objects.bulk_update(items, ['daily_usage', 'average_usage', 'last_consumed_at'])
@@ -1,19 +1,37 @@
-from django.shortcuts import render, redirect
+import json
+
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
 from django.urls import reverse
 
 from django.views import View
 from django.views.generic import ListView
 from django.views.generic.edit import CreateView
-from django.db import IntegrityError
+from django.db import IntegrityError, connections
 from django.contrib import messages
-from django.db.models import F, FloatField, ExpressionWrapper
 
-from .models import Household, Member, Store, Item
-from .forms import HouseholdCreateForm, HouseholdLoginForm, MemberCreateForm, StoreCreateForm, ItemCreateForm
+from .models import Household, Member, Store, Item, StockEvent
+from .hashers import VerificationBusy
+from .middleware import HouseholdRequiredMixin
+from .imports import import_items
+from .stock import StockUpdateError, parse_stock_deltas, apply_stock_deltas
+from .usage import record_stock_event
+from .exports import export_inventory, EXPORT_FORMATS
+from .shopping_list import get_shopping_list
+from .prices import get_cheapest_prices
+from .cache import get_household_version, fragment_context
+from .routers import shards, find_household
+from .pagination import KeysetPaginator, estimate_count
+from .forms import HouseholdCreateForm, HouseholdLoginForm, MemberCreateForm, StoreCreateForm, ItemCreateForm, ItemImportForm
 
 def home (request) :
     return render(request, 'home.html')
 
+def live_updates (request) :
+    # only reached without asgi.py, where LiveUpdates answers this path. 204 tells an
+    # EventSource not to reconnect, the page then simply stays as it was rendered
+    return HttpResponse(status = 204)
+
 class HouseholdCreate (CreateView) :
     model = Household
     form_class = HouseholdCreateForm
@@ -22,6 +40,12 @@ class HouseholdCreate (CreateView) :
     def form_valid (self, form) :
         try :
             household = form.save(commit = False)
+            household.normalize()
+
+            # the unique address constraint only holds within one shard
+            if len(shards()) > 1 and find_household(**household.address()) :
+                raise IntegrityError('household address exists on another shard')
+
             self.request.session['household'] = household.id
             return super().form_valid(form)
         
@@ -40,68 +64,51 @@ class HouseholdSelect (View) :
         form = self.form_class(request.POST)
 
         if form.is_valid() :
-            household = Household.objects.filter(
-            street_address = form.cleaned_data['street_address'],
-            city = form.cleaned_data['city'],
-            state = form.cleaned_data['state'],
-            zip_code = form.cleaned_data['zip_code']
-        ).first()
-            
-            if household and household.verify_passcode(form.cleaned_data['passcode']) :
-                request.session['household'] = household.id
-                return redirect(household.get_absolute_url())
+            household = find_household(
+                street_address = form.cleaned_data['street_address'],
+                city = form.cleaned_data['city'],
+                state = form.cleaned_data['state'],
+                zip_code = form.cleaned_data['zip_code']
+            )
             
-            else :
-                messages.error(self.request, 'Invalid address or passcode. Please try again')
+            try :
+                if household and household.verify_passcode(form.cleaned_data['passcode']) :
+                    request.session['household'] = household.id
+                    return redirect(household.get_absolute_url())
+                
+                else :
+                    messages.error(self.request, 'Invalid address or passcode. Please try again')
+
+            except VerificationBusy :
+                messages.error(self.request, 'Too many sign ins right now. Please try again')
         
         return render(request, self.template_name, { 'form': form })
 
-class MemberCreate (CreateView) :
+class MemberCreate (HouseholdRequiredMixin, CreateView) :
     model = Member
     form_class = MemberCreateForm
     template_name = 'member/member_create.html'
 
     def form_valid (self, form) :
         try :
-            household_id = self.request.session.get('household')
-
-            if not household_id :
-                messages.error(self.request, 'Household not found. Please try again')
-                return redirect('household_select')
-            
-            household = Household.objects.get(id = household_id)
-
             member = form.save(commit = False)
-            member.household = household
+            member.household = self.request.household
 
+            response = super().form_valid(form)
             self.request.session['member'] = member.id
-            return super().form_valid(form)
-        
-        except Household.DoesNotExist :
-            self.request.session.pop('household', None)
-            return redirect('household_select')
+            return response
         
         except IntegrityError :
             messages.error(self.request, 'Member already exists. Please try again')
             return self.form_invalid(form)
 
-class MemberSelect (View) :
+class MemberSelect (HouseholdRequiredMixin, View) :
     template_name = 'member/member_select.html'
+    # GETs may be served from a replica, see main_app.routers
+    replica_reads = True
 
     def get (self, request, *args, **kwargs) :
-        household_id = request.session.get('household')
-
-        if not household_id :
-            return redirect('household_select')
-    
-        try :
-            household = Household.objects.get(id = household_id)
-        
-        except Household.DoesNotExist :
-            request.session.pop('household', None)
-            return redirect('household_select')
-        
-        members = household.members.all()
+        members = request.household.members.all()
 
         if not members :
             return redirect('member_create')
@@ -109,17 +116,11 @@ class MemberSelect (View) :
         return render(request, self.template_name, { 'members': members })
     
     def post (self, request, *args, **kwargs) :
-        household_id = request.session.get('household')
-        
-        if not household_id :
-            return redirect('household_select')
-        
         member_id = request.POST.get('member_id')
         password = request.POST.get('password').strip()
         
         try :
-            household = Household.objects.get(id = household_id)
-            member = household.members.get(id = member_id)
+            member = request.household.members.get(id = member_id)
 
             if member and member.verify_password(password) :
                 request.session['member'] = member.id
@@ -127,41 +128,28 @@ class MemberSelect (View) :
             
             else :
                 messages.error(self.request, 'Invalid password. Please try again')
-
-        except Household.DoesNotExist :
-            request.session.pop('household', None)
-            return redirect('household_select')
     
         except Member.DoesNotExist :
             messages.error(request, 'Member does not exist')
+
+        except VerificationBusy :
+            messages.error(request, 'Too many sign ins right now. Please try again')
         
-        members = household.members.all()
+        members = request.household.members.all()
         return render(request, self.template_name, { 'members': members })
 
-class StoreCreate (CreateView) :
+class StoreCreate (HouseholdRequiredMixin, CreateView) :
     model = Store
     form_class = StoreCreateForm
     template_name = 'store/store_create.html'
 
     def form_valid (self, form) :
         try :
-            household_id = self.request.session.get('household')
-
-            if not household_id :
-                messages.error(self.request, 'Household not found. Please try again')
-                return redirect('household_select')
-            
-            household = Household.objects.get(id = household_id)
-
             store = form.save(commit = False)
-            store.household = household
+            store.household = self.request.household
 
             return super().form_valid(form)
         
-        except Household.DoesNotExist :
-            self.request.session.pop('household', None)
-            return redirect('household_select')
-        
         except IntegrityError :
             messages.error(self.request, 'Store already exists. Please try again')
             return self.form_invalid(form)
@@ -169,50 +157,97 @@ class StoreCreate (CreateView) :
     def get_success_url (self) :
         return reverse('store_list')
 
-class StoreList (View) :
+class StoreList (HouseholdRequiredMixin, View) :
     template_name = 'store/store_list.html'
+    # GETs may be served from a replica, see main_app.routers
+    replica_reads = True
 
     def get (self, request, *args, **kwargs) :
-        household_id = request.session.get('household')
-
-        if not household_id :
-            return redirect('household_select')
-    
-        try :
-            household = Household.objects.get(id = household_id)
-        
-        except Household.DoesNotExist :
-            request.session.pop('household', None)
-            return redirect('household_select')
-        
-        stores = household.stores.all()
+        # the version before the rows, a write committed in between then leaves the fragment under
+        # the old version rather than caching the old rows under the new one
+        version = get_household_version(request.household.id)
+        stores = request.household.stores.with_summary()
 
         if not stores :
             return redirect('store_create')
 
-        return render(request, self.template_name, { 'stores': stores })
+        return render(request, self.template_name, {
+            'stores': stores,
+            'fragment': fragment_context(request.household.id, version),
+        })
     
-class StoreItemList (ListView) :
+class StoreItemList (HouseholdRequiredMixin, ListView) :
     model = Item
     template_name = 'item/item_list.html'
+    # GETs may be served from a replica, see main_app.routers
+    replica_reads = True
     context_object_name = 'items'
     paginate_by = 25
+    # stores above this many items switch from ?page= offsets to keyset cursors
+    keyset_threshold = 1000
+
+    def get (self, request, *args, **kwargs) :
+        # read before the page of rows, as in StoreList
+        self.version = get_household_version(request.household.id)
+        return super().get(request, *args, **kwargs)
 
     def get_queryset (self) :
         store_id = self.kwargs['store_id']
-        return Item.objects.filter(store = store_id).annotate(
-            stock_ratio = ExpressionWrapper(
-                (F('current_stock') / F('minimum_stock')),
-                output_field = FloatField()
-            )
-        ).order_by('stock_ratio')
+        return Item.objects.filter(store = store_id).by_restock_urgency()
+
+    def paginate_queryset (self, queryset, page_size) :
+        cursor = self.request.GET.get('cursor')
+        last = self.request.GET.get('last') is not None
+
+        if not cursor and not last :
+            if self.request.GET.get(self.page_kwarg) :
+                return super().paginate_queryset(queryset, page_size)
+
+            estimated_count = estimate_count(queryset)
+
+            if estimated_count <= self.keyset_threshold :
+                # off postgres the estimate is an exact count, the paginator reuses it
+                if connections[queryset.db].vendor != 'postgresql' :
+                    self.known_count = estimated_count
+
+                return super().paginate_queryset(queryset, page_size)
+
+        else :
+            estimated_count = estimate_count(queryset) if self.request.GET.get('count') else None
+
+        paginator = KeysetPaginator(queryset, page_size, estimated_count = estimated_count)
+        page = paginator.page(cursor, last = last)
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_paginator (self, queryset, per_page, **kwargs) :
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+
+        if getattr(self, 'known_count', None) is not None :
+            paginator.count = self.known_count
+
+        return paginator
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['store'] = Store.objects.get(id = self.kwargs['store_id'])
+        context['store'] = get_object_or_404(Store, id = self.kwargs['store_id'], household = self.request.household)
+        context['fragment'] = fragment_context(self.request.household.id, self.version)
         return context
 
-class ItemCreate (CreateView) :
+class ShoppingList (HouseholdRequiredMixin, View) :
+    template_name = 'household/shopping_list.html'
+
+    def get (self, request, *args, **kwargs) :
+        shopping_list = get_shopping_list(request.household.id)
+        return render(request, self.template_name, { 'shopping_list': shopping_list })
+
+class CheapestPrices (HouseholdRequiredMixin, View) :
+    template_name = 'household/cheapest_prices.html'
+
+    def get (self, request, *args, **kwargs) :
+        prices = get_cheapest_prices(request.household.id)
+        return render(request, self.template_name, { 'prices': prices })
+
+class ItemCreate (HouseholdRequiredMixin, CreateView) :
     model = Item
     form_class = ItemCreateForm
     template_name = 'item/item_create.html'
@@ -224,16 +259,90 @@ class ItemCreate (CreateView) :
         return kwargs
 
     def form_valid (self, form) :
-        household_id = self.request.session.get('household')
-
-        if not household_id :
-            messages.error(self.request, 'Household not found. Please try again')
-            return redirect('household_select')
-        
-        store = Store.objects.get(id = self.kwargs['store_id'], household = household_id)
+        store = get_object_or_404(Store, id = self.kwargs['store_id'], household = self.request.household)
         item = form.save(commit = False)
         item.store = store
         return super().form_valid(form)
     
     def get_success_url (self) :
-        return reverse('store_list')
\ No newline at end of file
+        return reverse('store_list')
+
+class ItemImport (HouseholdRequiredMixin, View) :
+    form_class = ItemImportForm
+    template_name = 'item/item_import.html'
+
+    def get_store (self) :
+        return get_object_or_404(Store, id = self.kwargs['store_id'], household = self.request.household)
+
+    def get (self, request, *args, **kwargs) :
+        return render(request, self.template_name, { 'form': self.form_class(), 'store': self.get_store() })
+
+    def post (self, request, *args, **kwargs) :
+        store = self.get_store()
+        form = self.form_class(request.POST, request.FILES)
+        report = None
+
+        if form.is_valid() :
+            report = import_items(store, form.cleaned_data['file'], form.cleaned_data['format'])
+
+        return render(request, self.template_name, { 'form': form, 'store': store, 'report': report })
+
+class StockUpdate (HouseholdRequiredMixin, View) :
+    # POST {"item_id": delta, ...} for the whole household or a single store
+
+    def post (self, request, *args, **kwargs) :
+        store = None
+
+        if 'store_id' in kwargs :
+            store = get_object_or_404(Store, id = kwargs['store_id'], household = request.household)
+
+        try :
+            deltas = parse_stock_deltas(json.loads(request.body))
+        except ValueError :
+            return JsonResponse({ 'error': 'Invalid JSON' }, status = 400)
+        except StockUpdateError as error :
+            return JsonResponse({ 'error': str(error) }, status = 400)
+
+        stock, missing = apply_stock_deltas(request.household, deltas, store = store)
+        return JsonResponse({ 'stock': { str(item_id): value for item_id, value in stock.items() }, 'missing': missing })
+
+class StockEventCreate (HouseholdRequiredMixin, View) :
+    # POST {"kind": "consume" | "restock", "quantity": n} for one item
+
+    def post (self, request, *args, **kwargs) :
+        item = get_object_or_404(Item, id = kwargs['item_id'], store = kwargs['store_id'], store__household = request.household)
+
+        try :
+            data = json.loads(request.body)
+        except ValueError :
+            return JsonResponse({ 'error': 'Invalid JSON' }, status = 400)
+
+        kind = data.get('kind') if isinstance(data, dict) else None
+        quantity = data.get('quantity') if isinstance(data, dict) else None
+
+        if kind not in (StockEvent.RESTOCK, StockEvent.CONSUME) :
+            return JsonResponse({ 'error': 'kind must be restock or consume' }, status = 400)
+
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0 :
+            return JsonResponse({ 'error': 'quantity must be a positive whole number' }, status = 400)
+
+        item = record_stock_event(item.id, kind, quantity)
+        return JsonResponse({
+            'id': item.id,
+            'current_stock': item.current_stock,
+            'average_usage': item.average_usage,
+            'daily_usage': item.daily_usage,
+            'days_until_minimum': item.days_until_minimum(),
+        })
+
+class InventoryExport (HouseholdRequiredMixin, View) :
+    def get (self, request, *args, **kwargs) :
+        format = request.GET.get('format', 'csv')
+
+        if format not in EXPORT_FORMATS :
+            raise Http404('Unknown export format')
+
+        lines, content_type = export_inventory(request.household.id, format)
+        response = StreamingHttpResponse(lines, content_type = content_type)
+        response['Content-Disposition'] = f'attachment; filename="inventory.{format}"'
+        return response
\ No newline at end of file